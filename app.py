@@ -1,8 +1,14 @@
 import streamlit as st
 import tempfile
+import time
 import os
+import uuid
 from paper_analyzer import PaperAnalyzer
-from config import DEFAULT_MODEL, DEFAULT_PROVIDER, MODEL_CONFIGS
+from worker import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from events import EventBus, ProgressListener
+from budget import AnalysisBudget
+from profiling import Profiler
+from config import DEFAULT_PROVIDER, MODEL_CONFIGS, UPLOAD_DIR, APP_POLL_INTERVAL, REPLAY_PROVIDER, AVAILABLE_MODELS
 
 
 def initialize_session_state():
@@ -42,6 +48,18 @@ def authenticate_api_key(provider, api_key):
         return False
 
 
+class StreamlitProgress(ProgressListener):
+    """Drive a Streamlit progress bar from analyzer events."""
+
+    def __init__(self):
+        super().__init__(self.update)
+        self.bar = st.progress(0.0, text="Starting analysis...")
+
+    def update(self, label, fraction):
+        # Stage and figure events are emitted from the script thread, so updating the bar is safe here
+        self.bar.progress(fraction, text=f"{label}...")
+
+
 def api_key_form():
     """Display API key input form and handle authentication for multiple providers"""
     with st.sidebar:
@@ -112,39 +130,79 @@ def analyze_paper():
     st.title("Research Paper Analyzer")
     st.write("Upload a PDF file to analyze the paper, and extract insights based on your needs")
 
-    if not api_key_form():
-        return
-
-    provider = st.session_state.selected_provider
-    model_name = st.session_state[f"{provider}_selected_model"]
-    api_key = st.session_state.api_keys[provider]
+    replay = st.sidebar.checkbox(
+        "Replay recorded transcripts",
+        help="Answer from transcripts recorded by earlier runs instead of calling a provider (no network)."
+    )
+    if replay:
+        provider, api_key = REPLAY_PROVIDER, None
+        model_name = st.sidebar.selectbox("Recorded model", options=sorted({model for _, model in AVAILABLE_MODELS}))
+    else:
+        if not api_key_form():
+            return
+
+        provider = st.session_state.selected_provider
+        model_name = st.session_state[f"{provider}_selected_model"]
+        api_key = st.session_state.api_keys[provider]
+
+    use_worker = st.sidebar.checkbox(
+        "Run in background worker",
+        help="Queue the analysis for `python worker.py run` instead of running it in this session. "
+             "The worker uses the API keys from its own environment."
+    )
+    record = st.sidebar.checkbox(
+        "Record transcript",
+        disabled=replay,
+        help="Save every model request and response so the run can be replayed offline. "
+             "Replayed runs are not recorded."
+    ) and not replay
+    profile = st.sidebar.checkbox(
+        "Profile run",
+        help="Time PDF parsing, prompt building, model requests and file writes, and save a speedscope profile."
+    )
+    max_minutes = st.sidebar.number_input(
+        "Time budget (minutes, 0 for none)", min_value=0.0, value=0.0, step=1.0,
+        help="As the budget runs out, expansions are skipped and figure answers shortened."
+    )
 
     uploaded_file = st.file_uploader("Upload a PDF file", type="pdf")
     
     if uploaded_file:
         analyze_button = st.button("Analyze Paper")
-        if analyze_button:
+        if analyze_button and use_worker:
+            st.session_state.job_id = submit_job(uploaded_file, provider, model_name)
+        elif analyze_button:
             try:
-                with st.spinner("Processing your file..."):
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        tmp_path = tmp_file.name
-
-                    analyzer = PaperAnalyzer(
-                        tmp_path, 
-                        api_key=api_key,
-                        model_name=model_name,
-                        provider=provider
-                    )
-                    
-                    # Perform analysis
-                    analyzer.load_document()
-                    basic_info = analyzer.extract_basic_info()
-                    background = analyzer.analyze_background()
-                    figures = analyzer.analyze_figures()
-
-                    # Display results in tabs
-                    display_analysis_results(analyzer, basic_info, background, figures)
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+                    tmp_file.write(uploaded_file.getvalue())
+                    tmp_path = tmp_file.name
+
+                events = EventBus()
+                progress = events.subscribe(StreamlitProgress())
+                budget = AnalysisBudget(max_seconds=max_minutes * 60) if max_minutes else None
+                profiler = Profiler() if profile else None
+                analyzer = PaperAnalyzer(
+                    tmp_path, 
+                    api_key=api_key,
+                    model_name=model_name,
+                    provider=provider,
+                    events=events,
+                    budget=budget,
+                    record=record,
+                    profiler=profiler
+                )
+                
+                # Perform analysis
+                analyzer.analyze()
+                progress.bar.empty()
+                if budget is not None and budget.cuts:
+                    st.warning("Parts of the analysis were cut to stay within the budget")
+                    st.text(budget.report())
+                if profiler is not None:
+                    display_profile(analyzer, profiler)
+
+                # Display results in tabs
+                display_analysis_results(analyzer)
 
             except Exception as e:
                 st.error(f"Error processing file: {str(e)}")
@@ -153,8 +211,79 @@ def analyze_paper():
                 if 'tmp_path' in locals():
                     os.unlink(tmp_path)
 
+    if use_worker and st.session_state.get('job_id'):
+        display_job(st.session_state.job_id, api_key)
+
+
+def submit_job(uploaded_file, provider, model_name):
+    """Save the upload where the worker can read it and queue it for analysis."""
+    upload_dir = os.path.join(UPLOAD_DIR, uuid.uuid4().hex)
+    os.makedirs(upload_dir, exist_ok=True)
+    pdf_path = os.path.join(upload_dir, os.path.basename(uploaded_file.name))
+    with open(pdf_path, 'wb') as f:
+        f.write(uploaded_file.getvalue())
+    return JobQueue().submit(pdf_path, provider=provider, model_name=model_name)
+
+
+def display_job(job_id, api_key):
+    """Display the status of a queued job, or its results once it has finished."""
+    job = JobQueue().get(job_id)
+    if job is None:
+        st.warning(f"Job {job_id} not found")
+        return
+
+    if job['status'] in (QUEUED, RUNNING):
+        label = job['stage'] or "Waiting for a worker..."
+        st.progress(job['progress'], text=f"Job {job_id}: {label}")
+        # Poll until the job finishes; the rerun re-reads its status from the queue
+        time.sleep(APP_POLL_INTERVAL)
+        st.rerun()
+    elif job['status'] == FAILED:
+        st.error(f"Job {job_id} failed: {job['error']}")
+    elif job['status'] == DONE:
+        analyzer = PaperAnalyzer(
+            job['pdf_path'],
+            api_key=api_key,
+            model_name=job['model_name'],
+            provider=job['provider'],
+            output_dir=job['output_dir']
+        )
+        display_job_results(analyzer)
+
+
+def display_job_results(analyzer):
+    """Display results written by the background worker."""
+    tab1, tab2, tab3, tab4 = st.tabs(["Basic Info", "Background", "Figures Analysis", "Custom Query"])
+
+    with tab1:
+        st.subheader("Paper Details")
+        metadata_path = os.path.join(analyzer.output_dir, "metadata.txt")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as f:
+                st.text(f.read())
+        else:
+            st.warning("Paper details not available")
+
+    with tab2:
+        display_background(analyzer)
+
+    with tab3:
+        display_figures(analyzer)
+
+    with tab4:
+        display_custom_query(analyzer)
+
+
+def display_profile(analyzer, profiler):
+    """Show the run's time breakdown and offer the speedscope profile for download."""
+    with st.expander("Profile"):
+        st.text(profiler.table())
+        with open(os.path.join(analyzer.output_dir, "profile.speedscope.json"), 'rb') as f:
+            st.download_button("Download speedscope profile", f.read(),
+                               file_name=f"{analyzer.base_filename}.speedscope.json", mime="application/json")
+
 
-def display_analysis_results(analyzer, basic_info, background, figures):
+def display_analysis_results(analyzer):
     """Display analysis results in organized tabs."""
     tab1, tab2, tab3, tab4 = st.tabs(["Basic Info", "Background", "Figures Analysis", "Custom Query"])
 
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Build a synthetic corpus of analyzed papers and time index construction and queries."""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import build_corpus_index, CorpusIndex  # noqa: E402
+
+VOCABULARY_SIZE = 20000
+QUERIES = ["attention model benchmark results", "protein structure prediction",
+           "gradient descent convergence", "figure accuracy baseline comparison"]
+
+
+def write_synthetic_corpus(output_dir: str, papers: int, words_per_paper: int, seed: int = 0) -> None:
+    """Write papers whose text follows a Zipf-like word distribution, with query words the most common."""
+    rng = random.Random(seed)
+    vocabulary = " ".join(QUERIES).split() + [f"term{i}" for i in range(VOCABULARY_SIZE)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for i in range(papers):
+        paper_dir = os.path.join(output_dir, f"paper_{i:05d}")
+        os.makedirs(paper_dir)
+        text = " ".join(rng.choices(vocabulary, weights, k=words_per_paper))
+        with open(os.path.join(paper_dir, "background.txt"), 'w', encoding='utf-8') as f:
+            f.write(text)
+        with open(os.path.join(paper_dir, "metadata.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Title: Synthetic paper {i}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the corpus index")
+    parser.add_argument("--papers", type=int, default=2000, help="Number of synthetic papers")
+    parser.add_argument("--words", type=int, default=4000, help="Words of text per paper")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = os.path.join(tmp, "output")
+        index_dir = os.path.join(tmp, "index")
+        write_synthetic_corpus(output_dir, args.papers, args.words)
+
+        start = time.perf_counter()
+        stats = build_corpus_index(output_dir, index_dir)
+        print(f"Built index: {stats['papers']} papers, {stats['chunks']} chunks, {stats['terms']} terms "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        index = CorpusIndex(index_dir)
+        print(f"Opened index in {(time.perf_counter() - start) * 1000:.1f} ms")
+        with index:
+            for query in QUERIES:
+                timings = []
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    index.search(query)
+                    timings.append((time.perf_counter() - start) * 1000)
+                print(f"{query:<40} median {statistics.median(timings):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
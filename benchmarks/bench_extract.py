@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Compare serial and page-parallel PDF text extraction on a large PDF."""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_loader import extract_pages  # noqa: E402
+
+LINE = "Deep widgets outperform shallow baselines across all benchmark settings and seeds."
+
+
+def make_large_pdf(path: str, pages: int) -> None:
+    """Write a PDF with `pages` pages of dense text."""
+    import pymupdf
+
+    doc = pymupdf.open()
+    for i in range(pages):
+        page = doc.new_page()
+        text = "\n".join(f"{i}.{n} {LINE}" for n in range(60))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def time_run(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs parallel PDF extraction")
+    parser.add_argument("pdf_path", nargs="?", help="PDF to extract (default: generate one)")
+    parser.add_argument("--pages", type=int, default=500, help="Pages in the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1],
+                        help="Worker counts to compare")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per configuration")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf_path
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp, "large.pdf")
+            make_large_pdf(pdf_path, args.pages)
+
+        serial = time_run(lambda: extract_pages(pdf_path, workers=1), args.repeats)
+        print(f"{'serial':<16}{serial:>10.1f} ms")
+
+        try:
+            from langchain_community.document_loaders import PyMuPDFLoader
+            loader = time_run(lambda: PyMuPDFLoader(pdf_path).load(), args.repeats)
+            print(f"{'PyMuPDFLoader':<16}{loader:>10.1f} ms")
+        except ImportError:
+            pass
+
+        for workers in sorted(set(args.workers)):
+            parallel = time_run(lambda: extract_pages(pdf_path, workers=workers), args.repeats)
+            print(f"{f'{workers} workers':<16}{parallel:>10.1f} ms  ({serial / parallel:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Measure CLI startup cost: importing the entry point versus the heavy dependencies it defers."""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "python (baseline)": "pass",
+    "import paper_analyzer": "import paper_analyzer",
+    "paper_analyzer --help": "import sys; sys.argv = ['paper-analyzer', '--help']\n"
+                             "import paper_analyzer\n"
+                             "try:\n    paper_analyzer.main()\nexcept SystemExit:\n    pass",
+    "import heavy deps": "import dotenv, pydantic, pymupdf, langchain.prompts, langchain_openai, "
+                         "langchain_community.document_loaders",
+}
+
+
+def time_case(code: str, repeats: int) -> list:
+    """Run `code` in a fresh interpreter `repeats` times and return wall times in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark paper analyzer import time")
+    parser.add_argument("--repeats", type=int, default=5, help="Interpreter launches per case")
+    args = parser.parse_args()
+
+    print(f"{'case':<28}{'median ms':>12}{'min ms':>12}")
+    for name, code in CASES.items():
+        timings = time_case(code, args.repeats)
+        print(f"{name:<28}{statistics.median(timings):>12.1f}{min(timings):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Measure the per-call overhead of query_document with an instant fake model client."""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+from templates import FIGURE_INFO_TEMPLATE, EXPAND_ANSWER_TEMPLATE  # noqa: E402
+
+PARAGRAPH = ("We evaluate deep widgets on twelve benchmarks and find consistent gains over shallow "
+             "baselines, with the largest improvements on long-horizon tasks. ")
+
+
+def make_document(pages: int) -> list:
+    """A loaded paper: one LangChain Document per page, with PyMuPDFLoader-style metadata."""
+    from langchain_core.documents import Document
+
+    metadata = {"source": "papers/widgets.pdf", "file_path": "papers/widgets.pdf", "total_pages": pages,
+                "format": "PDF 1.5", "title": "Deep Widgets", "author": "A. Author", "producer": "pdfTeX"}
+    return [Document(page_content=PARAGRAPH * 40, metadata={**metadata, "page": i}) for i in range(pages)]
+
+
+def fake_chat_model():
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    return RunnableLambda(lambda prompt: AIMessage(content="answer"))
+
+
+def uncached_query(document, prompt_template, llm, **prompt_variables):
+    """query_document before chains and rendered text were cached: everything is rebuilt per call."""
+    from langchain.prompts import PromptTemplate
+
+    prompt = PromptTemplate(template=prompt_template, input_variables=list(prompt_variables.keys()))
+    chain = prompt | llm
+    return chain.invoke({"text": document, **prompt_variables})
+
+
+def time_calls(fn, calls: int, repeats: int) -> float:
+    """Median microseconds per call."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(calls):
+            fn(i)
+        timings.append((time.perf_counter() - start) / calls)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query_document per-call overhead")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 40], help="Paper sizes to compare")
+    parser.add_argument("--calls", type=int, default=200, help="Calls per timing run")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing runs per configuration")
+    args = parser.parse_args()
+
+    llm = fake_chat_model()
+    utils.get_chat_model = lambda *args: llm
+
+    print(f"{'pages':>6} {'template':<10} {'uncached us':>12} {'cached us':>10} {'speedup':>8}")
+    for pages in args.pages:
+        document = make_document(pages)
+        # Figure questions and expansions, which also pass the paper as `text`
+        cases = [("figure", FIGURE_INFO_TEMPLATE, lambda i: {"figure_number": i}),
+                 ("expand", EXPAND_ANSWER_TEMPLATE, lambda i: {"answer": "An answer.", "text": document})]
+        for name, template, variables in cases:
+            def uncached(i):
+                uncached_query(document, template, llm, **variables(i))
+
+            def cached(i):
+                utils.query_document(document, template, api_key="key", **variables(i))
+
+            before = time_calls(uncached, args.calls, args.repeats)
+            after = time_calls(cached, args.calls, args.repeats)
+            print(f"{pages:>6} {name:<10} {before:>12.1f} {after:>10.1f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
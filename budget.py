@@ -0,0 +1,74 @@
+import threading
+import time
+
+from config import BUDGET_LOW_FRACTION
+from events import Event, LLM_CALL, BUDGET_CUT, emit
+
+
+class AnalysisBudget:
+    """
+    Wall-clock and token budget for one analysis run.
+
+    Subscribe it to the analyzer's EventBus: it counts the tokens reported by llm_call
+    events, and the analyzer asks it whether to run, shorten or skip later stages.
+    """
+
+    def __init__(self, max_seconds: float = None, max_tokens: int = None,
+                 low_fraction: float = BUDGET_LOW_FRACTION, events=None):
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.low_fraction = low_fraction
+        self.events = events
+        self.tokens_used = 0
+        self.cuts = []
+        self._started = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the wall-clock budget; called when the analysis begins."""
+        self._started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return 0.0 if self._started is None else time.perf_counter() - self._started
+
+    def __call__(self, event: Event) -> None:
+        if event.type == LLM_CALL and event.data.get("tokens"):
+            with self._lock:
+                self.tokens_used += event.data["tokens"]
+
+    def remaining_fraction(self) -> float:
+        """Return the smaller of the remaining time and token fractions (1.0 when unlimited)."""
+        fractions = [1.0]
+        if self.max_seconds:
+            fractions.append(1 - self.elapsed / self.max_seconds)
+        if self.max_tokens:
+            fractions.append(1 - self.tokens_used / self.max_tokens)
+        return max(0.0, min(fractions))
+
+    def is_low(self) -> bool:
+        return self.remaining_fraction() < self.low_fraction
+
+    def is_exhausted(self) -> bool:
+        return self.remaining_fraction() <= 0.0
+
+    def cut(self, stage: str, action: str) -> None:
+        """Record that part of the analysis was shortened or skipped to stay within budget."""
+        with self._lock:
+            self.cuts.append({"stage": stage, "action": action, "elapsed": round(self.elapsed, 1),
+                              "tokens_used": self.tokens_used})
+        emit(self.events, BUDGET_CUT, stage=stage, action=action)
+
+    def report(self) -> str:
+        """Summarize limits, usage and everything that was cut."""
+        lines = [
+            f"Time: {self.elapsed:.1f}s" + (f" of {self.max_seconds:g}s" if self.max_seconds else ""),
+            f"Tokens: {self.tokens_used}" + (f" of {self.max_tokens}" if self.max_tokens else ""),
+        ]
+        if self.cuts:
+            lines.append("Cut to stay within budget:")
+            lines.extend(f"- {cut['stage']}: {cut['action']} (at {cut['elapsed']}s, {cut['tokens_used']} tokens)"
+                         for cut in self.cuts)
+        else:
+            lines.append("Nothing was cut.")
+        return "\n".join(lines) + "\n"
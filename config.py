@@ -1,6 +1,16 @@
 PAPER_DIR = "papers"
 OUTPUT_DIR = "output"
 
+# Background worker
+JOBS_DIR = "jobs"
+JOBS_DB = "jobs/jobs.db"
+UPLOAD_DIR = "jobs/uploads"  # Persistent copies of PDFs submitted from the app
+WORKER_CONCURRENCY = 2  # Papers analyzed at the same time
+WORKER_POLL_INTERVAL = 1.0  # Seconds between queue polls when idle
+WORKER_HEARTBEAT_INTERVAL = 10.0  # Seconds between a worker's heartbeats on its running jobs
+WORKER_STALE_AFTER = 60.0  # Running jobs without a heartbeat for this long are requeued
+APP_POLL_INTERVAL = 2.0  # Seconds between job status refreshes in the Streamlit app
+
 # Model configurations
 DEFAULT_PROVIDER = "openai"
 DEFAULT_MODEL = "gpt-4o"
@@ -26,6 +36,75 @@ MODEL_CONFIGS = {
     }
 }
 
+# Environment variables holding each provider's API key
+API_KEY_ENV_VARS = {
+    "openai": "OPENAI_API_KEY",
+    "openrouter": "OPENROUTER_API_KEY",
+    "gemini": "GOOGLE_API_KEY"
+}
+
+# Seconds to wait for the primary provider before sending a hedged request to the backup
+HEDGE_AFTER_SECONDS = 20.0
+
 # Get available models for all providers
 AVAILABLE_MODELS = [(provider, model) for provider, config in MODEL_CONFIGS.items() 
                    for model in config["models"]]
+
+# Sections sent to each stage, matched against section titles. A stage falls back to the
+# full paper text when its selection is shorter than SECTION_MIN_CHARS.
+STAGE_SECTIONS = {
+    "background": ["abstract", "introduction", "related work", "background", "preliminaries"],
+    "figures": ["method", "approach", "experiment", "evaluation", "result", "discussion"]
+}
+SECTION_MIN_CHARS = 500
+
+# Minimum confidence for using locally extracted title/authors/abstract instead of an LLM call
+LOCAL_DETAILS_MIN_CONFIDENCE = 0.8
+
+# Corpus index over all analyzed papers
+CORPUS_INDEX_DIR = "corpus_index"
+CORPUS_CHUNK_WORDS = 200
+CORPUS_TOP_K = 8  # Passages sent to the model per corpus query
+
+# Page-parallel PDF text extraction
+PARALLEL_EXTRACT_MIN_PAGES = 64  # Smaller documents are loaded serially with PyMuPDFLoader
+EXTRACT_WORKERS = None  # Processes used for parallel extraction (None: one per CPU)
+
+# Generation limits. Output-token caps per stage (None: no cap) and a per-request timeout.
+STAGE_MAX_TOKENS = {
+    "basic_info": 1024,
+    "background": 4096,
+    "figure_info": 2048,
+    "figure_connection": 2048,
+    "expansion": 4096,
+    "custom_query": None
+}
+REQUEST_TIMEOUT = 180  # Seconds
+# When less than this fraction of a run's time/token budget remains, expansions are skipped
+# and figure answers are capped at SHORT_ANSWER_MAX_TOKENS
+BUDGET_LOW_FRACTION = 0.3
+SHORT_ANSWER_MAX_TOKENS = 512
+
+# Transcripts. `--record` writes each paper's model requests and responses to TRANSCRIPT_FILE in its
+# output directory; the "replay" provider answers from the transcripts found under the analyzer's
+# output directory, or under REPLAY_DIR when none is given.
+TRANSCRIPT_FILE = "transcript.jsonl.gz"
+REPLAY_PROVIDER = "replay"
+REPLAY_DIR = OUTPUT_DIR
+REPLAY_LATENCY_SCALE = 0.0  # 0 answers immediately; 1 waits for each recorded latency
+
+# Compiled `prompt | llm` chains kept per (template, model client), and loaded papers whose
+# rendered prompt text is kept for reuse across calls
+CHAIN_CACHE_SIZE = 128
+RENDER_CACHE_SIZE = 8
+
+# Profiling (--profile): functions listed from cProfile and allocation sites from tracemalloc
+PROFILE_TOP_FUNCTIONS = 25
+
+# Figure extraction
+FIGURES_DIR = "figures"  # Created under each paper's output directory
+FIGURE_DPI = 150
+FIGURE_MAX_SIZE = 1024  # Longest side of a rendered crop, in pixels
+
+# Models that accept image input (entries ending in "*" match by prefix)
+VISION_MODELS = ["gpt-4o", "gemini-1.5-*"]
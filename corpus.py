@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+import argparse
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+import uuid
+from array import array
+
+from config import (OUTPUT_DIR, DEFAULT_MODEL, DEFAULT_PROVIDER, API_KEY_ENV_VARS,
+                    CORPUS_INDEX_DIR, CORPUS_CHUNK_WORDS, CORPUS_TOP_K)
+
+# Per chunk: paper id, text offset, text length (bytes)
+CHUNK_RECORD = struct.Struct("<IQI")
+INDEX_VERSION = 2
+# Each build is written to its own directory under builds/; the `current` file names the live one
+BUILDS_DIR = "builds"
+CURRENT_FILE = "current"
+ARTIFACTS = [("metadata", "metadata.txt"), ("background", "background.txt"), ("figures", "figures_analysis.txt")]
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were which with
+we our their these those can not but also than then there been into such using used use based
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _chunk_words(text: str, size: int):
+    """Split text into chunks of about `size` words."""
+    words = text.split()
+    for start in range(0, len(words), size):
+        yield " ".join(words[start:start + size])
+
+
+def _paper_chunks(paper_dir: str, chunk_words: int):
+    """Yield (source, text) chunks from a paper's analysis artifacts and parsed structure."""
+    for source, filename in ARTIFACTS:
+        path = os.path.join(paper_dir, filename)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for chunk in _chunk_words(f.read(), chunk_words):
+                    yield source, chunk
+
+    structure_path = os.path.join(paper_dir, "structure.json")
+    if os.path.exists(structure_path):
+        from document_model import DocumentModel
+
+        with open(structure_path, 'r', encoding='utf-8') as f:
+            model = DocumentModel.from_dict(json.load(f)["document"])
+        for section in model.sections:
+            for chunk in _chunk_words(section.text(), chunk_words):
+                yield f"section: {section.title}", chunk
+
+
+def build_corpus_index(output_dir: str = OUTPUT_DIR, index_dir: str = CORPUS_INDEX_DIR,
+                       chunk_words: int = CORPUS_CHUNK_WORDS) -> dict:
+    """
+    Build a BM25 index over every analyzed paper in output_dir.
+
+    The index is written as flat binary files (chunk records, chunk text, chunk lengths and
+    postings) that CorpusIndex memory-maps, plus a JSON vocabulary and paper list. Each build
+    goes to a new directory and is published by atomically replacing the `current` pointer, so
+    readers see either the old index or the new one, never a mix. Open indexes stay readable;
+    the build before the new one is kept and older ones are removed.
+
+    Returns:
+        Counts of papers, chunks and terms indexed
+    """
+    index_abspath = os.path.abspath(index_dir)
+    build = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    build_dir = os.path.join(index_dir, BUILDS_DIR, build)
+    os.makedirs(build_dir)
+    try:
+        stats = _write_index(output_dir, build_dir, index_abspath, chunk_words)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    previous = current_build(index_dir)
+    pointer = os.path.join(index_dir, CURRENT_FILE)
+    with open(pointer + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(build)
+    os.replace(pointer + ".tmp", pointer)
+
+    for name in os.listdir(os.path.join(index_dir, BUILDS_DIR)):
+        if name not in (build, previous):
+            shutil.rmtree(os.path.join(index_dir, BUILDS_DIR, name), ignore_errors=True)
+    return stats
+
+
+def current_build(index_dir: str):
+    """Return the name of the live build in index_dir, or None if no index has been built."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_index(output_dir: str, build_dir: str, index_abspath: str, chunk_words: int) -> dict:
+    """Write the index files for every paper in output_dir into build_dir."""
+    papers = []
+    postings = {}  # term -> array of interleaved (chunk id, term frequency)
+    lengths = array("I")
+    chunk_count = 0
+    total_tokens = 0
+
+    def new_file(name):
+        return os.path.join(build_dir, name)
+
+    with open(new_file("chunks.bin"), 'wb') as records, open(new_file("text.bin"), 'wb') as texts:
+        text_offset = 0
+        for name in sorted(os.listdir(output_dir)):
+            paper_dir = os.path.join(output_dir, name)
+            if not os.path.isdir(paper_dir) or os.path.abspath(paper_dir) == index_abspath:
+                continue
+            paper_id = None
+            for source, chunk in _paper_chunks(paper_dir, chunk_words):
+                tokens = tokenize(chunk)
+                if not tokens:
+                    continue
+                if paper_id is None:
+                    paper_id = len(papers)
+                    papers.append(name)
+
+                data = f"{source}\n{chunk}".encode("utf-8")
+                texts.write(data)
+                records.write(CHUNK_RECORD.pack(paper_id, text_offset, len(data)))
+                lengths.append(len(tokens))
+                text_offset += len(data)
+
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, tf in counts.items():
+                    term_postings = postings.get(token)
+                    if term_postings is None:
+                        term_postings = postings[token] = array("I")
+                    term_postings.append(chunk_count)
+                    term_postings.append(tf)
+                chunk_count += 1
+                total_tokens += len(tokens)
+
+    with open(new_file("lengths.bin"), 'wb') as f:
+        lengths.tofile(f)
+
+    vocabulary = {}
+    with open(new_file("postings.bin"), 'wb') as f:
+        offset = 0
+        for term in sorted(postings):
+            term_postings = postings[term]
+            term_postings.tofile(f)
+            vocabulary[term] = [offset, len(term_postings) // 2]
+            offset += len(term_postings)
+
+    with open(new_file("vocabulary.json"), 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, separators=(",", ":"))
+    meta = {
+        "version": INDEX_VERSION,
+        "papers": papers,
+        "chunk_count": chunk_count,
+        "average_length": total_tokens / chunk_count if chunk_count else 0.0
+    }
+    with open(new_file("meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    return {"papers": len(papers), "chunks": chunk_count, "terms": len(vocabulary)}
+
+
+class CorpusIndex:
+    def __init__(self, index_dir: str = CORPUS_INDEX_DIR, build: str = None):
+        """
+        Open an index built by build_corpus_index, memory-mapping its binary files. Opens the
+        live build unless `build` names one.
+        """
+        self.build = build or current_build(index_dir)
+        if self.build is None:
+            if os.path.exists(os.path.join(index_dir, "meta.json")):
+                raise ValueError(f"Unsupported corpus index version in {index_dir}; rebuild the index")
+            raise FileNotFoundError(f"No corpus index in {index_dir}; build one with `python corpus.py build`")
+        build_dir = os.path.join(index_dir, BUILDS_DIR, self.build)
+        with open(os.path.join(build_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported corpus index version in {index_dir}; rebuild the index")
+        with open(os.path.join(build_dir, "vocabulary.json"), 'r', encoding='utf-8') as f:
+            self.vocabulary = json.load(f)
+        self.papers = meta["papers"]
+        self.chunk_count = meta["chunk_count"]
+        self.average_length = meta["average_length"] or 1.0
+
+        self._files = []
+        self._maps = []
+        self.records = self._map(os.path.join(build_dir, "chunks.bin"))
+        self.texts = self._map(os.path.join(build_dir, "text.bin"))
+        self.lengths = self._map_array(os.path.join(build_dir, "lengths.bin"))
+        self.postings = self._map_array(os.path.join(build_dir, "postings.bin"))
+
+    def _map(self, path):
+        f = open(path, 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def _map_array(self, path):
+        """Memory-map a file written with array("I").tofile as an unsigned int view."""
+        mapped = self._map(path)
+        return memoryview(mapped).cast("I") if len(mapped) else memoryview(array("I"))
+
+    def close(self) -> None:
+        self.lengths.release()
+        self.postings.release()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def chunk(self, chunk_id: int) -> dict:
+        """Return the paper, source and text of a chunk."""
+        paper_id, offset, length = CHUNK_RECORD.unpack_from(self.records, chunk_id * CHUNK_RECORD.size)
+        source, _, text = bytes(self.texts[offset:offset + length]).decode("utf-8").partition("\n")
+        return {"paper": self.papers[paper_id], "source": source, "text": text}
+
+    def search(self, query: str, top_k: int = CORPUS_TOP_K, papers: list = None) -> list:
+        """
+        Return the top_k chunks ranked by BM25, best first.
+
+        Args:
+            query: Free-text query
+            top_k: Number of chunks to return
+            papers: Optional list of paper names to restrict the search to
+        """
+        allowed = {self.papers.index(p) for p in papers if p in self.papers} if papers else None
+        scores = {}
+        lengths = self.lengths
+        for term in set(tokenize(query)):
+            entry = self.vocabulary.get(term)
+            if entry is None:
+                continue
+            offset, count = entry
+            idf = math.log(1 + (self.chunk_count - count + 0.5) / (count + 0.5))
+            term_postings = self.postings[offset:offset + 2 * count]
+            chunk_ids, frequencies = term_postings[0::2], term_postings[1::2]
+            norm = K1 * (1 - B)
+            scale = K1 * B / self.average_length
+            for chunk_id, tf in zip(chunk_ids, frequencies):
+                score = idf * tf * (K1 + 1) / (tf + norm + scale * lengths[chunk_id])
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + score
+
+        if allowed is not None:
+            scores = {c: s for c, s in scores.items()
+                      if CHUNK_RECORD.unpack_from(self.records, c * CHUNK_RECORD.size)[0] in allowed}
+
+        hits = []
+        for chunk_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            hit = self.chunk(chunk_id)
+            hit["score"] = score
+            hits.append(hit)
+        return hits
+
+
+_open_indexes = {}  # index directory -> (build, CorpusIndex)
+_open_indexes_lock = threading.Lock()
+
+
+def open_corpus_index(index_dir: str = CORPUS_INDEX_DIR) -> CorpusIndex:
+    """
+    Return a shared CorpusIndex for index_dir, opening it again only after the index is rebuilt.
+
+    The returned index stays open for reuse by later calls; do not close it.
+    """
+    key = os.path.abspath(index_dir)
+    build = current_build(index_dir)
+    with _open_indexes_lock:
+        cached = _open_indexes.get(key)
+        if cached is not None and build is not None and cached[0] == build:
+            return cached[1]
+        # A replaced index is released once the searches still using it finish
+        index = CorpusIndex(index_dir, build)
+        _open_indexes[key] = (build, index)
+        return index
+
+
+def query_corpus(question: str, index_dir: str = CORPUS_INDEX_DIR, top_k: int = CORPUS_TOP_K,
+                 model_name: str = DEFAULT_MODEL, provider: str = DEFAULT_PROVIDER, api_key: str = None,
+                 papers: list = None, events=None):
+    """
+    Answer a question across the corpus, sending only the top-ranked chunks to the LLM.
+
+    Returns:
+        A (answer, hits) tuple; answer is the model's text response
+    """
+    from templates import CORPUS_QUERY_TEMPLATE
+    from utils import query_document
+
+    hits = open_corpus_index(index_dir).search(question, top_k=top_k, papers=papers)
+    if not hits:
+        return "No relevant passages were found in the corpus.", hits
+
+    context = "\n\n".join(f"[{hit['paper']} | {hit['source']}]\n{hit['text']}" for hit in hits)
+    response = query_document(
+        context,
+        prompt_template=CORPUS_QUERY_TEMPLATE,
+        model_name=model_name,
+        provider=provider,
+        api_key=api_key,
+        events=events,
+        question=question
+    )
+    return response.content, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query an index over all analyzed papers")
+    parser.add_argument("--index-dir", help="Corpus index directory", default=CORPUS_INDEX_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Index every paper in the output directory")
+    build_parser.add_argument("--output-dir", help="Directory with per-paper analysis results", default=OUTPUT_DIR)
+    build_parser.add_argument("--chunk-words", type=int, default=CORPUS_CHUNK_WORDS, help="Words per chunk")
+
+    query_parser = subparsers.add_parser("query", help="Ask a question across the corpus")
+    query_parser.add_argument("question", help="Question to answer")
+    query_parser.add_argument("--top-k", type=int, default=CORPUS_TOP_K, help="Passages sent to the model")
+    query_parser.add_argument("--paper", action="append", dest="papers", help="Restrict to this paper (repeatable)")
+    query_parser.add_argument("--search-only", action="store_true", help="Print matching passages without calling the LLM")
+    query_parser.add_argument("--model-name", help="Model name", default=DEFAULT_MODEL)
+    query_parser.add_argument("--provider", help="Model provider", default=DEFAULT_PROVIDER)
+    query_parser.add_argument("--api-key", help="API key (defaults to the provider's environment variable)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_corpus_index(args.output_dir, args.index_dir, args.chunk_words)
+        print(f"Indexed {stats['papers']} papers ({stats['chunks']} chunks, {stats['terms']} terms) into {args.index_dir}")
+        return
+
+    if args.search_only:
+        try:
+            hits = open_corpus_index(args.index_dir).search(args.question, top_k=args.top_k, papers=args.papers)
+        except Exception as e:
+            print(f"Error querying corpus: {str(e)}")
+            exit(1)
+        for hit in hits:
+            print(f"[{hit['score']:.2f}] {hit['paper']} | {hit['source']}\n{hit['text'][:300]}\n")
+        return
+
+    import dotenv
+    dotenv.load_dotenv()
+    api_key = args.api_key or os.getenv(API_KEY_ENV_VARS.get(args.provider, ""))
+    try:
+        answer, hits = query_corpus(args.question, args.index_dir, top_k=args.top_k, model_name=args.model_name,
+                                    provider=args.provider, api_key=api_key, papers=args.papers)
+    except Exception as e:
+        print(f"Error querying corpus: {str(e)}")
+        exit(1)
+    print(answer)
+    print("\nSources:")
+    for hit in hits:
+        print(f"- {hit['paper']} ({hit['source']})")
+
+
+if __name__ == "__main__":
+    main()
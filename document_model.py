@@ -0,0 +1,236 @@
+import json
+import os
+import re
+from collections import Counter
+
+from events import emit, CACHE_HIT
+from figures import CAPTION_PATTERN, match_caption
+
+TABLE_CAPTION_PATTERN = re.compile(r"^\s*table\s*(\d+)\s*[.:|]?", re.IGNORECASE)
+# "3", "3.", "3.1", "IV." followed by a capitalised title
+NUMBERED_HEADING_PATTERN = re.compile(r"^((?:\d+\.)*\d+|[IVX]+)\.?\s+[A-Z]")
+KNOWN_HEADING_PATTERN = re.compile(
+    r"^(abstract|introduction|related work|background|preliminaries|method(s|ology)?|approach|"
+    r"experiments?|experimental setup|evaluation|results?|discussion|limitations|conclusions?|"
+    r"future work|references|bibliography|acknowledge?ments?|appendix)\b",
+    re.IGNORECASE
+)
+REFERENCES_PATTERN = re.compile(r"^(references|bibliography)\b", re.IGNORECASE)
+
+# Headings are at least this much larger than body text, unless bold or numbered
+HEADING_SIZE_RATIO = 1.15
+MAX_HEADING_CHARS = 100
+BOLD_FLAG = 16
+# Bumped when parsing changes, so structures cached by older versions are parsed again
+PARSER_VERSION = 2
+
+
+class Paragraph:
+    __slots__ = ("text", "page")
+
+    def __init__(self, text: str, page: int):
+        self.text = text
+        self.page = page
+
+
+class Caption:
+    __slots__ = ("kind", "number", "text", "page")
+
+    def __init__(self, kind: str, number: int, text: str, page: int):
+        self.kind = kind  # "figure" or "table"
+        self.number = number
+        self.text = text
+        self.page = page
+
+
+class Section:
+    __slots__ = ("title", "level", "page", "paragraphs")
+
+    def __init__(self, title: str, level: int, page: int, paragraphs: list = None):
+        self.title = title
+        self.level = level
+        self.page = page
+        self.paragraphs = paragraphs if paragraphs is not None else []
+
+    def text(self) -> str:
+        return "\n\n".join(p.text for p in self.paragraphs)
+
+
+class DocumentModel:
+    __slots__ = ("title", "page_count", "sections", "captions", "references")
+
+    def __init__(self, title: str, page_count: int, sections: list, captions: list, references: list):
+        self.title = title
+        self.page_count = page_count
+        self.sections = sections
+        self.captions = captions
+        self.references = references
+
+    def select(self, *names) -> str:
+        """
+        Return the text of every section whose title contains one of `names` (case-insensitive),
+        including its subsections, with section titles as headers.
+        """
+        names = [name.lower() for name in names]
+        parts = []
+        selected_level = None
+        for section in self.sections:
+            if selected_level is not None and section.level > selected_level:
+                parts.append(f"{section.title}\n{section.text()}")
+                continue
+            selected_level = None
+            if any(name in section.title.lower() for name in names):
+                selected_level = section.level
+                parts.append(f"{section.title}\n{section.text()}")
+        return "\n\n".join(parts)
+
+    def page_text(self, page: int) -> str:
+        """Return all section titles and paragraphs that start on the given page, in reading order."""
+        parts = []
+        for section in self.sections:
+            if section.page == page and section.level > 0:
+                parts.append(section.title)
+            parts.extend(p.text for p in section.paragraphs if p.page == page)
+        return "\n\n".join(parts)
+
+    def captions_text(self, kind: str = "figure") -> str:
+        return "\n".join(c.text for c in self.captions if c.kind == kind)
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "page_count": self.page_count,
+            # Compact row format: paragraphs are [text, page]
+            "sections": [[s.title, s.level, s.page, [[p.text, p.page] for p in s.paragraphs]]
+                         for s in self.sections],
+            "captions": [[c.kind, c.number, c.text, c.page] for c in self.captions],
+            "references": [[p.text, p.page] for p in self.references]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DocumentModel":
+        return cls(
+            title=data["title"],
+            page_count=data["page_count"],
+            sections=[Section(title, level, page, [Paragraph(*p) for p in paragraphs])
+                      for title, level, page, paragraphs in data["sections"]],
+            captions=[Caption(*c) for c in data["captions"]],
+            references=[Paragraph(*p) for p in data["references"]]
+        )
+
+
+def _block_text_and_style(block):
+    """Return (lines, largest font size, all-bold) for a text block from page.get_text("dict")."""
+    lines, sizes, bold = [], [], True
+    for line in block["lines"]:
+        line_text = "".join(span["text"] for span in line["spans"]).strip()
+        if line_text:
+            lines.append(line_text)
+        for span in line["spans"]:
+            if span["text"].strip():
+                sizes.append(span["size"])
+                bold = bold and (bool(span["flags"] & BOLD_FLAG) or "bold" in span["font"].lower())
+    return lines, (max(sizes) if sizes else 0), bold and bool(sizes)
+
+
+def _caption(lines):
+    """
+    Return (kind, number) if the block is a figure or table caption, else None. Paragraphs that
+    merely start with "Figure 3 shows ..." are not captions and stay in their section.
+    """
+    text = "\n".join(lines)
+    for kind, pattern in (("figure", CAPTION_PATTERN), ("table", TABLE_CAPTION_PATTERN)):
+        match = match_caption(text, pattern)
+        if match is not None:
+            number, caption_shaped = match
+            return (kind, number) if caption_shaped else None
+    return None
+
+
+def _heading_level(text: str, size: float, bold: bool, body_size: float):
+    """Return the heading level of a block, or None if it is not a heading."""
+    if len(text) > MAX_HEADING_CHARS:
+        return None
+    if text.endswith((".", ",", ";")) and not KNOWN_HEADING_PATTERN.match(text):
+        return None
+    numbered = NUMBERED_HEADING_PATTERN.match(text)
+    known = KNOWN_HEADING_PATTERN.match(text) and len(text.split()) <= 4
+    larger = size >= body_size * HEADING_SIZE_RATIO
+    if not (larger or (bold and (numbered or known)) or (known and size >= body_size)):
+        return None
+    if numbered and numbered.group(1)[0].isdigit():
+        return numbered.group(1).count(".") + 1
+    return 1
+
+
+def parse_document(pdf_path: str) -> DocumentModel:
+    """Build a DocumentModel from the PDF using font-size/bold heuristics and numbered headings."""
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        pages = [[b for b in page.get_text("dict")["blocks"] if b["type"] == 0] for page in doc]
+        page_count = len(doc)
+        metadata_title = (doc.metadata or {}).get("title", "").strip()
+
+    blocks = []
+    size_counts = Counter()
+    for page_number, page_blocks in enumerate(pages):
+        for block in page_blocks:
+            lines, size, bold = _block_text_and_style(block)
+            if lines:
+                text = " ".join(lines)
+                blocks.append((page_number, text, size, bold, _caption(lines)))
+                size_counts[round(size, 1)] += len(text)
+    body_size = size_counts.most_common(1)[0][0] if size_counts else 0
+
+    # The largest text on the first page is taken as the title
+    first_page = [b for b in blocks if b[0] == 0]
+    title = max(first_page, key=lambda b: b[2])[1] if first_page else metadata_title
+
+    sections = [Section("Front matter", 0, 0)]
+    captions, references = [], []
+    in_references = False
+    for page_number, text, size, bold, caption in blocks:
+        if caption is not None:
+            captions.append(Caption(*caption, text, page_number))
+            continue
+
+        level = None if text == title and page_number == 0 else _heading_level(text, size, bold, body_size)
+        if level is not None:
+            sections.append(Section(text, level, page_number))
+            in_references = bool(REFERENCES_PATTERN.match(text))
+            continue
+
+        paragraph = Paragraph(text, page_number)
+        if in_references:
+            references.append(paragraph)
+        sections[-1].paragraphs.append(paragraph)
+
+    return DocumentModel(title, page_count, sections, captions, references)
+
+
+def _source_key(pdf_path: str) -> dict:
+    stat = os.stat(pdf_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "version": PARSER_VERSION}
+
+
+def load_document_model(pdf_path: str, cache_path: str, events=None) -> DocumentModel:
+    """
+    Return the cached DocumentModel for the PDF, parsing and caching it if it is missing or stale.
+    Reusing the cache emits a cache_hit event on `events`.
+    """
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("source") == _source_key(pdf_path):
+                model = DocumentModel.from_dict(cached["document"])
+                emit(events, CACHE_HIT, cache="structure")
+                return model
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    model = parse_document(pdf_path)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({"source": _source_key(pdf_path), "document": model.to_dict()}, f, separators=(",", ":"))
+    return model
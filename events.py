@@ -0,0 +1,198 @@
+"""
+Pipeline events and their listeners.
+
+`llm_call` reports one event per request as the pipeline sees it; retries made inside a
+provider's client library are not reported, so their time shows up in that call's duration.
+`cache_hit` names the reused cache: figures, structure, chain (a compiled prompt chain) or
+render (a document's prompt text).
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Event types
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+LLM_CALL = "llm_call"
+FIGURE_COMPLETED = "figure_completed"
+EXPANSION_COMPLETED = "expansion_completed"
+HEDGE = "hedge"
+LOG = "log"
+CACHE_HIT = "cache_hit"
+LOCAL_DETAILS = "local_details"
+BUDGET_CUT = "budget_cut"
+
+# Upper bounds (seconds) of the LLM call latency histogram buckets
+LATENCY_BUCKETS = [0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+
+@dataclass
+class Event:
+    type: str
+    timestamp: float
+    data: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "timestamp": self.timestamp, **self.data}
+
+
+class EventBus:
+    def __init__(self):
+        """Initialize an event bus with no listeners."""
+        self.listeners = []
+
+    def subscribe(self, listener):
+        """Register a callable that receives every Event; returns the listener."""
+        self.listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener) -> None:
+        self.listeners.remove(listener)
+
+    def emit(self, event_type: str, **data) -> None:
+        """Send an event to all listeners. Costs a single check when nobody is listening."""
+        if not self.listeners:
+            return
+        event = Event(event_type, time.time(), data)
+        for listener in list(self.listeners):
+            listener(event)
+
+    @contextmanager
+    def stage(self, name: str, **data):
+        """Emit stage_start/stage_end events around a block, with its duration and outcome."""
+        self.emit(STAGE_START, stage=name, **data)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.emit(STAGE_END, stage=name, duration=time.perf_counter() - start, status=status, **data)
+
+
+def emit(events, event_type: str, **data) -> None:
+    """Emit on an optional EventBus, so helpers can accept events=None."""
+    if events is not None:
+        events.emit(event_type, **data)
+
+
+class ConsoleListener:
+    """Print progress to stdout, in the format the CLI has always used."""
+
+    def __call__(self, event: Event) -> None:
+        if event.type == STAGE_START:
+            print(f"{event.data['stage']}...")
+        elif event.type == FIGURE_COMPLETED:
+            print(f"Progress: {event.data['completed']}/{event.data['total']} figures completed "
+                  f"(Figure {event.data['figure_number']} done)")
+        elif event.type == EXPANSION_COMPLETED:
+            print(f"Progress: {event.data['completed']}/{event.data['total']} expansions completed "
+                  f"(Figure {event.data['figure_number']} done)")
+        elif event.type == BUDGET_CUT:
+            print(f"Budget: {event.data['stage']} {event.data['action']}")
+        elif event.type == LOG:
+            print(event.data["message"])
+
+
+class ProgressListener:
+    """Turn pipeline events into (label, fraction) updates passed to on_progress."""
+
+    def __init__(self, on_progress):
+        self.on_progress = on_progress
+        self.stage = None
+        self.index = 0
+        self.total = 1
+
+    def __call__(self, event: Event) -> None:
+        if event.type == STAGE_START and "index" in event.data:
+            self.stage = event.data["stage"]
+            self.index = event.data["index"]
+            self.total = event.data["total"]
+            self.on_progress(self.stage, self.index / self.total)
+        elif event.type in (FIGURE_COMPLETED, EXPANSION_COMPLETED):
+            # Figures are answered then expanded, each taking half of the stage
+            expanding = event.type == EXPANSION_COMPLETED
+            within = (0.5 if expanding else 0.0) + 0.5 * event.data["completed"] / event.data["total"]
+            verb = "expanded" if expanding else "analyzed"
+            self.on_progress(
+                f"{self.stage} ({event.data['completed']}/{event.data['total']} figures {verb})",
+                (self.index + within) / self.total
+            )
+
+
+class JsonLinesListener:
+    """Append every event as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Event) -> None:
+        line = json.dumps(event.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+class MetricsListener:
+    """Aggregate events into counters and latency histograms in the Prometheus text format."""
+
+    def __init__(self, prefix: str = "paper_analyzer"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.event_counts = {}
+        self.stage_seconds = {}  # stage -> [sum, count]
+        self.llm_buckets = [0] * len(LATENCY_BUCKETS)
+        self.llm_sum = 0.0
+        self.llm_count = 0
+        self.llm_tokens = 0
+
+    def __call__(self, event: Event) -> None:
+        with self._lock:
+            key = (event.type, event.data.get("cache", ""))
+            self.event_counts[key] = self.event_counts.get(key, 0) + 1
+            if event.type == STAGE_END:
+                totals = self.stage_seconds.setdefault(event.data["stage"], [0.0, 0])
+                totals[0] += event.data["duration"]
+                totals[1] += 1
+            elif event.type == LLM_CALL:
+                duration = event.data["duration"]
+                self.llm_sum += duration
+                self.llm_count += 1
+                self.llm_tokens += event.data.get("tokens") or 0
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if duration <= bound:
+                        self.llm_buckets[i] += 1
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus exposition format."""
+        p = self.prefix
+        with self._lock:
+            lines = [f"# TYPE {p}_events_total counter"]
+            for (event_type, cache), count in sorted(self.event_counts.items()):
+                labels = f'type="{event_type}"' + (f',cache="{cache}"' if cache else "")
+                lines.append(f"{p}_events_total{{{labels}}} {count}")
+
+            lines.append(f"# TYPE {p}_stage_seconds summary")
+            for stage, (total, count) in sorted(self.stage_seconds.items()):
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+            lines.append(f"# TYPE {p}_llm_call_seconds histogram")
+            for bound, count in zip(LATENCY_BUCKETS, self.llm_buckets):
+                lines.append(f'{p}_llm_call_seconds_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{p}_llm_call_seconds_bucket{{le="+Inf"}} {self.llm_count}')
+            lines.append(f"{p}_llm_call_seconds_sum {self.llm_sum:.6f}")
+            lines.append(f"{p}_llm_call_seconds_count {self.llm_count}")
+            lines.append(f"# TYPE {p}_llm_tokens_total counter")
+            lines.append(f"{p}_llm_tokens_total {self.llm_tokens}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the metrics to a file, e.g. for the node_exporter textfile collector."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import pymupdf
+
+from config import FIGURES_DIR, FIGURE_DPI, FIGURE_MAX_SIZE
+
+# Matches "Figure 3", "Fig. 3:", "FIGURE 3." at the start of a caption block
+CAPTION_PATTERN = re.compile(r"^\s*(?:figure|fig\.?)\s*(\d+)\s*[.:|]?", re.IGNORECASE)
+# What follows the number in a caption: punctuation or the end of the line, unlike "Figure 3 shows"
+CAPTION_SEPARATOR_PATTERN = re.compile(r"[ \t]*(?:\.(?!\d)|[:|—–]|\n|$)")
+# Longer blocks starting with "Figure N" are body paragraphs referring to a figure
+MAX_CAPTION_CHARS = 1000
+
+# Bumped when figure location changes, so crops cached by older versions are re-extracted
+CACHE_VERSION = 2
+# Graphics smaller than this (in points) are treated as decorations, not figures
+MIN_GRAPHIC_SIZE = 20
+# Text-only fallback regions must be at least this tall (in points)
+MIN_FALLBACK_HEIGHT = 50
+
+
+def match_caption(text: str, pattern=CAPTION_PATTERN):
+    """
+    Return (number, caption_shaped) if the block text starts like a caption, else None.
+
+    A block is caption-shaped when its number is followed by punctuation or a line break
+    ("Figure 3:", "Fig. 3.") and it is not paragraph-long; "Figure 3 shows ..." is not.
+    """
+    match = pattern.match(text)
+    if match is None:
+        return None
+    separated = CAPTION_SEPARATOR_PATTERN.match(text, match.end(1)) is not None
+    return int(match.group(1)), separated and len(text) <= MAX_CAPTION_CHARS
+
+
+@dataclass
+class FigureCrop:
+    number: int
+    page: int
+    bbox: List[float]
+    caption: str
+    image_path: str
+
+
+class FigureExtractor:
+    def __init__(self, pdf_path: str, output_dir: str, dpi: int = FIGURE_DPI, max_size: int = FIGURE_MAX_SIZE):
+        """Initialize FigureExtractor with the pdf path and the paper's output directory."""
+        self.pdf_path = pdf_path
+        self.figures_dir = os.path.join(output_dir, FIGURES_DIR)
+        self.index_path = os.path.join(self.figures_dir, "index.json")
+        self.dpi = dpi
+        self.max_size = max_size
+        self.from_cache = False
+
+    def extract(self) -> Dict[int, FigureCrop]:
+        """Locate every captioned figure and render a crop of it, reusing cached crops when possible."""
+        cached = self._load_cache()
+        self.from_cache = cached is not None
+        if cached is not None:
+            return cached
+
+        os.makedirs(self.figures_dir, exist_ok=True)
+        figures = {}
+        with pymupdf.open(self.pdf_path) as doc:
+            # Several blocks may start with "Figure N"; keep the most caption-like one for each
+            # number, and the first of equally good ones (later ones are usually references)
+            best = {}
+            for page in doc:
+                for number, caption, rect, score in self._locate_figures(page):
+                    if number not in best or score > best[number][0]:
+                        best[number] = (score, page.number, caption, rect)
+            for number, (_, page_number, caption, rect) in sorted(best.items()):
+                image_path = os.path.join(self.figures_dir, f"figure_{number}.png")
+                self._render(doc[page_number], rect, image_path)
+                figures[number] = FigureCrop(
+                    number=number,
+                    page=page_number,
+                    bbox=[round(v, 2) for v in rect],
+                    caption=caption,
+                    image_path=image_path
+                )
+
+        self._write_cache(figures)
+        return figures
+
+    def _locate_figures(self, page):
+        """
+        Yield (number, caption, rect, score) for each block on the page that starts like a figure
+        caption. The score ranks candidates: caption-shaped text scores 2 and graphics directly
+        above it 1. Paragraph-like matches are only yielded when graphics sit above them.
+        """
+        blocks = [b for b in page.get_text("blocks") if b[6] == 0]  # text blocks only
+        graphics = self._graphic_rects(page)
+
+        captions = []
+        for block in blocks:
+            match = match_caption(block[4])
+            if match:
+                captions.append((*match, " ".join(block[4].split()), pymupdf.Rect(block[:4])))
+        captions.sort(key=lambda c: c[3].y0)
+
+        previous_bottom = page.rect.y0
+        for number, caption_shaped, caption, caption_rect in captions:
+            # Graphics sitting between the previous caption and this one, overlapping it horizontally
+            above = [g for g in graphics
+                     if g.y1 <= caption_rect.y0 + 5 and g.y0 >= previous_bottom - 5
+                     and g.x1 > caption_rect.x0 - page.rect.width / 4
+                     and g.x0 < caption_rect.x1 + page.rect.width / 4]
+            if above:
+                rect = pymupdf.Rect(above[0])
+                for g in above[1:]:
+                    rect |= g
+            elif caption_shaped:
+                rect = self._fallback_rect(page, blocks, caption_rect, previous_bottom)
+            else:
+                # A paragraph mentioning a figure, with nothing drawn above it
+                continue
+            previous_bottom = caption_rect.y1
+            if rect is not None:
+                yield number, caption, rect & page.rect, 2 * caption_shaped + bool(above)
+
+    def _graphic_rects(self, page):
+        """Return bounding boxes of images and vector drawing clusters on the page."""
+        rects = [pymupdf.Rect(info["bbox"]) for info in page.get_image_info()]
+        if hasattr(page, "cluster_drawings"):
+            rects.extend(page.cluster_drawings())
+        return [r for r in rects
+                if r.width >= MIN_GRAPHIC_SIZE and r.height >= MIN_GRAPHIC_SIZE and not r.is_infinite]
+
+    def _fallback_rect(self, page, blocks, caption_rect, previous_bottom):
+        """Use the empty band above the caption when no graphics were detected (e.g. text-rendered plots)."""
+        top = previous_bottom
+        for block in blocks:
+            if block[3] <= caption_rect.y0 and block[3] > top and block[1] < caption_rect.y0:
+                # A regular paragraph directly above the caption bounds the figure from the top
+                if len(block[4]) > 200:
+                    top = block[3]
+        if caption_rect.y0 - top < MIN_FALLBACK_HEIGHT:
+            return None
+        return pymupdf.Rect(page.rect.x0, top, page.rect.x1, caption_rect.y0)
+
+    def _render(self, page, rect, image_path):
+        """Render the clipped region at the configured DPI, downscaled to fit max_size."""
+        zoom = self.dpi / 72
+        longest = max(rect.width, rect.height) * zoom
+        if longest > self.max_size:
+            # Leave a pixel of slack: MuPDF rounds the clip outwards
+            zoom *= (self.max_size - 1) / longest
+        pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), clip=rect)
+        pixmap.save(image_path)
+
+    def _cache_key(self) -> dict:
+        stat = os.stat(self.pdf_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "dpi": self.dpi, "max_size": self.max_size,
+                "version": CACHE_VERSION}
+
+    def _load_cache(self) -> Optional[Dict[int, FigureCrop]]:
+        """Return cached crops if they were rendered from the same file with the same settings."""
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("source") != self._cache_key():
+            return None
+        figures = {int(n): FigureCrop(**fig) for n, fig in index["figures"].items()}
+        if not all(os.path.exists(fig.image_path) for fig in figures.values()):
+            return None
+        return figures
+
+    def _write_cache(self, figures: Dict[int, FigureCrop]) -> None:
+        index = {
+            "source": self._cache_key(),
+            "figures": {str(n): asdict(fig) for n, fig in figures.items()}
+        }
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
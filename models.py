@@ -1,7 +1,11 @@
 from dataclasses import dataclass
-from typing import Optional
-from langchain_openai import ChatOpenAI
-from langchain.chat_models.base import BaseChatModel
+from functools import lru_cache
+from typing import Optional, TYPE_CHECKING
+
+from config import VISION_MODELS, REPLAY_PROVIDER, REPLAY_DIR
+
+if TYPE_CHECKING:
+    from langchain.chat_models.base import BaseChatModel
 
 
 @dataclass
@@ -10,19 +14,37 @@ class ModelConfig:
     model_name: str
     api_key: str
     api_base: Optional[str] = None
+    max_tokens: Optional[int] = None  # Cap on generated tokens per request
+    timeout: Optional[float] = None  # Request timeout in seconds
     
-    def create_chat_model(self) -> BaseChatModel:
+    def create_chat_model(self) -> "BaseChatModel":
         """Create a chat model instance based on the provider configuration."""
+        if self.provider == REPLAY_PROVIDER:
+            # Offline: answers come from recorded transcripts under api_base
+            from transcript import ReplayChatModel
+            return ReplayChatModel(self.api_base or REPLAY_DIR, self.model_name)
+
+        # Imported here so that loading this module stays cheap for cached runs and --help
+        from langchain_openai import ChatOpenAI
+
+        limits = {}
+        if self.max_tokens is not None:
+            limits["max_tokens"] = self.max_tokens
+        if self.timeout is not None:
+            limits["timeout"] = self.timeout
+
         if self.provider == "openai":
             return ChatOpenAI(
                 model_name=self.model_name,
-                openai_api_key=self.api_key
+                openai_api_key=self.api_key,
+                **limits
             )
         elif self.provider == "openrouter":
             return ChatOpenAI(
                 model_name=self.model_name,
                 openai_api_key=self.api_key,
                 openai_api_base=self.api_base,
+                **limits,
                 default_headers={
                     "HTTP-Referer": "https://github.com/cascade", # Required for OpenRouter
                     "X-Title": "Paper Analyzer"  # Optional, helps OpenRouter track usage
@@ -32,17 +54,39 @@ class ModelConfig:
             return ChatOpenAI(
                 model_name=self.model_name,
                 openai_api_key=self.api_key,
-                openai_api_base=self.api_base
+                openai_api_base=self.api_base,
+                **limits
             )
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
 
 
-def create_model_config(provider: str, model_name: str, api_key: str, api_base: Optional[str] = None) -> ModelConfig:
+def create_model_config(provider: str, model_name: str, api_key: str, api_base: Optional[str] = None,
+                        max_tokens: Optional[int] = None, timeout: Optional[float] = None) -> ModelConfig:
     """Factory function to create a ModelConfig instance."""
     return ModelConfig(
         provider=provider,
         model_name=model_name,
         api_key=api_key,
-        api_base=api_base
+        api_base=api_base,
+        max_tokens=max_tokens,
+        timeout=timeout
     )
+
+
+@lru_cache(maxsize=32)
+def get_chat_model(provider: str, model_name: str, api_key: str, api_base: Optional[str] = None,
+                   max_tokens: Optional[int] = None, timeout: Optional[float] = None) -> "BaseChatModel":
+    """Return a shared chat model client, creating it on first use so connections stay warm."""
+    return create_model_config(provider, model_name, api_key, api_base, max_tokens, timeout).create_chat_model()
+
+
+def supports_vision(model_name: str) -> bool:
+    """Check whether the model accepts image input according to VISION_MODELS."""
+    for pattern in VISION_MODELS:
+        if pattern.endswith("*"):
+            if model_name.startswith(pattern[:-1]):
+                return True
+        elif model_name == pattern:
+            return True
+    return False
@@ -1,65 +1,177 @@
 #!/usr/bin/env python3
 
 import argparse
-import dotenv
 import os
-from pydantic import BaseModel, Field
-from langchain_community.document_loaders import PyMuPDFLoader
 
-from config import OUTPUT_DIR, DEFAULT_MODEL, DEFAULT_PROVIDER
-from utils import query_document, process_figure_answers, expand_figure_answers, write_analysis_to_file, query_and_expand
-from templates import FIGURE_COUNT_TEMPLATE, EXTRACT_DETAILS_TEMPLATE, BACKGROUND_TEMPLATE
+# Heavy dependencies (LangChain, pydantic, PyMuPDF, dotenv) are imported inside the
+# functions that need them so that `--help` and cached runs start quickly.
+from config import (OUTPUT_DIR, DEFAULT_MODEL, DEFAULT_PROVIDER, API_KEY_ENV_VARS, MODEL_CONFIGS, HEDGE_AFTER_SECONDS,
+                    STAGE_SECTIONS, SECTION_MIN_CHARS, LOCAL_DETAILS_MIN_CONFIDENCE,
+                    PARALLEL_EXTRACT_MIN_PAGES, EXTRACT_WORKERS, STAGE_MAX_TOKENS, SHORT_ANSWER_MAX_TOKENS,
+                    TRANSCRIPT_FILE, REPLAY_PROVIDER)
+from models import supports_vision
+from events import EventBus, ConsoleListener, JsonLinesListener, MetricsListener, CACHE_HIT, LOCAL_DETAILS, LOG
+from utils import (query_document, process_figure_answers, expand_figure_answers, write_analysis_to_file,
+                   query_and_expand, fan_out_query, hedged_query, render_document)
+from profiling import Profiler, section, profiled
+from templates import FIGURE_COUNT_TEMPLATE, EXTRACT_DETAILS_TEMPLATE, BACKGROUND_TEMPLATE, CUSTOM_QUERY_TEMPLATE
 
-# Pydantic models
-class FiguresCount(BaseModel):
-    total_figures: int = Field(description="Total number of figures in the paper")
 
-class PaperDetails(BaseModel):
-    title: str = Field(description="Title of the paper")
-    abstract: str = Field(description="Abstract of the paper")
-    authors: str = Field(description="Authors of the paper")
+def __getattr__(name):
+    # Keep `from paper_analyzer import PaperDetails` working without importing pydantic eagerly
+    if name in ("FiguresCount", "PaperDetails"):
+        import schemas
+        return getattr(schemas, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class PaperAnalyzer:
-    def __init__(self, pdf_path: str, api_key: str, model_name: str = DEFAULT_MODEL, provider: str = DEFAULT_PROVIDER, output_dir: str = OUTPUT_DIR):
-        """Initialize PaperAnalyzer with pdf path and output directory."""
+    def __init__(self, pdf_path: str, api_key: str, model_name: str = DEFAULT_MODEL, provider: str = DEFAULT_PROVIDER, output_dir: str = OUTPUT_DIR,
+                 events: EventBus = None, budget=None, stage_max_tokens: dict = None, record: bool = False,
+                 profiler=None):
+        """
+        Initialize PaperAnalyzer with pdf path and output directory. Progress is reported on `events`.
+
+        `budget` is an optional AnalysisBudget; when it runs low, later stages are shortened or
+        skipped. `stage_max_tokens` overrides the per-stage response caps in STAGE_MAX_TOKENS.
+        With `record`, every model request and response is written to TRANSCRIPT_FILE in the
+        output directory, for replay with the "replay" provider, which answers from the transcripts
+        under `output_dir`. A `profiler` (profiling.Profiler) times the run and writes its profile
+        files to the output directory.
+        """
+        if record and provider == REPLAY_PROVIDER:
+            raise ValueError("Cannot record a replayed run: it would overwrite the transcript being replayed")
         self.pdf_path = pdf_path
         self.base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
         self.output_dir = os.path.join(output_dir, self.base_filename)
         self.document = None
+        self.structure = None
         self.details_response = None
         self.figure_count_response = None
+        self.figures = {}
         self.model_name = model_name
         self.provider = provider
         self.api_key = api_key
+        self.replay_dir = output_dir if provider == REPLAY_PROVIDER else None
+        self.events = events or EventBus()
+        self.stage_max_tokens = {**STAGE_MAX_TOKENS, **(stage_max_tokens or {})}
+        self.budget = budget
+        self.profiler = profiler
+        if budget is not None:
+            budget.events = self.events
+            self.events.subscribe(budget)
         
         # Create output directory structure
         os.makedirs(self.output_dir, exist_ok=True)
+
+        self.transcript = None
+        if record:
+            from transcript import TranscriptRecorder
+            self.transcript = TranscriptRecorder(os.path.join(self.output_dir, TRANSCRIPT_FILE))
     
-    def load_document(self):
-        """Load the PDF document."""
-        loader = PyMuPDFLoader(self.pdf_path)
-        self.document = loader.load()
-    
+    def load_document(self, parallel: bool = None):
+        """
+        Load the PDF document.
+
+        Args:
+            parallel: Extract pages on a process pool. By default this is done for documents
+                with at least PARALLEL_EXTRACT_MIN_PAGES pages, where it pays for the pool startup
+        """
+        from pdf_loader import load_pdf_documents, page_count
+
+        with section("extract_text"):
+            if parallel is None:
+                parallel = page_count(self.pdf_path) >= PARALLEL_EXTRACT_MIN_PAGES
+            if parallel:
+                self.document = load_pdf_documents(self.pdf_path, workers=EXTRACT_WORKERS)
+            else:
+                from langchain_community.document_loaders import PyMuPDFLoader
+
+                loader = PyMuPDFLoader(self.pdf_path)
+                self.document = loader.load()
+        self.load_structure()
+
+    @profiled("parse_structure")
+    def load_structure(self):
+        """Parse the paper's sections, or reuse the parse cached in structure.json."""
+        from document_model import load_document_model
+
+        try:
+            self.structure = load_document_model(self.pdf_path, os.path.join(self.output_dir, "structure.json"),
+                                                 events=self.events)
+        except Exception as e:
+            # Without a structure every stage receives the full document
+            self.events.emit(LOG, level="warning", message=f"Could not parse paper structure: {str(e)}")
+            self.structure = None
+
+    def stage_text(self, stage: str) -> str:
+        """
+        Return the text a stage should see: the sections listed in STAGE_SECTIONS, the first
+        page ("details") or the figure captions ("figure_count"), falling back to the full
+        document text when the structure is unavailable or the selection is too short.
+        """
+        full_text = render_document(self.document, events=self.events)
+        if self.structure is None:
+            return full_text
+        if stage == "details":
+            # The title, authors and abstract are on the first page, however short it is
+            return self.structure.page_text(0) or full_text
+        elif stage == "figure_count":
+            # Captions are short by nature; any figure caption is enough to count from
+            return self.structure.captions_text("figure") or full_text
+        text = self.structure.select(*STAGE_SECTIONS[stage])
+        if stage == "figures" and text:
+            text = f"{text}\n\nFigure captions:\n{self.structure.captions_text('figure')}"
+        return text if len(text) >= SECTION_MIN_CHARS else full_text
+
     def extract_basic_info(self):
-        """Extract paper details and figure count."""
+        """
+        Extract paper details and figure count.
+
+        Details come from the PDF metadata and first-page layout when the local extraction is
+        confident enough; otherwise the LLM is asked, given only the first page.
+        """
+        from schemas import FiguresCount, PaperDetails
+        from paper_details import extract_local_details
+
         self.figure_count_response = query_document(
-            self.document,
+            self.stage_text("figure_count"),
             prompt_template=FIGURE_COUNT_TEMPLATE,
             model_name=self.model_name,
             provider=self.provider,
             api_key=self.api_key,
-            pydantic_model=FiguresCount
+            pydantic_model=FiguresCount,
+            events=self.events,
+            transcript=self.transcript,
+            replay_dir=self.replay_dir,
+            max_tokens=self.stage_max_tokens["basic_info"]
         )
         
+        try:
+            with section("local_details"):
+                details, confidence = extract_local_details(self.pdf_path)
+        except Exception as e:
+            self.events.emit(LOG, level="warning", message=f"Could not extract paper details locally: {str(e)}")
+            details, confidence = None, 0.0
+        use_local = confidence >= LOCAL_DETAILS_MIN_CONFIDENCE
+        self.events.emit(LOCAL_DETAILS, confidence=confidence, used=use_local)
+        if use_local:
+            self.details_response = PaperDetails(**details)
+            return
+
         self.details_response = query_document(
-            self.document,
+            self.stage_text("details"),
             prompt_template=EXTRACT_DETAILS_TEMPLATE,
             model_name=self.model_name,
             provider=self.provider,
             api_key=self.api_key,
-            pydantic_model=PaperDetails
+            pydantic_model=PaperDetails,
+            events=self.events,
+            transcript=self.transcript,
+            replay_dir=self.replay_dir,
+            max_tokens=self.stage_max_tokens["basic_info"]
         )
     
+    @profiled("write_metadata")
     def write_metadata(self):
         """Write paper metadata to a separate file."""
         metadata_file = os.path.join(self.output_dir, "metadata.txt")
@@ -70,105 +182,325 @@ class PaperAnalyzer:
             f.write(f"Number of figures: {self.figure_count_response.total_figures}\n")
     
     def analyze_background(self):
-        """Extract and write background information."""
-        print(f"Extracting background information...")
-        background_response = query_and_expand(
-            self.document,
-            prompt_template=BACKGROUND_TEMPLATE,
-            model_name=self.model_name,
-            provider=self.provider,
-            api_key=self.api_key,
-            text=self.document
-        )
+        """Extract and write background information, without the expansion pass when the budget is low."""
+        if self.budget is not None and self.budget.is_exhausted():
+            self.budget.cut("Background", "skipped")
+            return
+        background_text = self.stage_text("background")
+        if self.budget is not None and self.budget.is_low():
+            self.budget.cut("Background", "expansion skipped")
+            background_response = query_document(
+                background_text,
+                prompt_template=BACKGROUND_TEMPLATE,
+                model_name=self.model_name,
+                provider=self.provider,
+                api_key=self.api_key,
+                events=self.events,
+                transcript=self.transcript,
+                replay_dir=self.replay_dir,
+                max_tokens=self.stage_max_tokens["background"],
+                text=background_text
+            )
+        else:
+            background_response = query_and_expand(
+                background_text,
+                prompt_template=BACKGROUND_TEMPLATE,
+                model_name=self.model_name,
+                provider=self.provider,
+                api_key=self.api_key,
+                events=self.events,
+                transcript=self.transcript,
+                replay_dir=self.replay_dir,
+                max_tokens=self.stage_max_tokens["background"],
+                expansion_max_tokens=self.stage_max_tokens["expansion"],
+                text=background_text
+            )
         
         background_file = os.path.join(self.output_dir, "background.txt")
-        with open(background_file, 'w', encoding='utf-8') as f:
+        with section("write_background"), open(background_file, 'w', encoding='utf-8') as f:
             f.write(background_response.content)
     
+    @profiled("render_figures")
+    def extract_figures(self):
+        """Render figure crops for vision-capable models."""
+        if not supports_vision(self.model_name):
+            return
+        from figures import FigureExtractor
+
+        try:
+            extractor = FigureExtractor(self.pdf_path, self.output_dir)
+            self.figures = extractor.extract()
+            if extractor.from_cache:
+                self.events.emit(CACHE_HIT, cache="figures", count=len(self.figures))
+        except Exception as e:
+            # Crops are an optimisation; fall back to text-only figure analysis
+            self.events.emit(LOG, level="warning", message=f"Could not extract figure images: {str(e)}")
+            self.figures = {}
+
     def analyze_figures(self):
-        """Process and write figure analysis."""
-        print(f"Analyzing figures...")
+        """
+        Process and write figure analysis.
+
+        When the budget is low, answers are capped at SHORT_ANSWER_MAX_TOKENS and not expanded;
+        figures reached after it is exhausted are skipped.
+        """
+        if self.budget is not None and self.budget.is_exhausted():
+            self.budget.cut("Figures", "skipped")
+            return
+        low = self.budget is not None and self.budget.is_low()
+        if low:
+            self.budget.cut("Figures", "answers shortened")
+        self.extract_figures()
+        figures_text = self.stage_text("figures")
         answers = process_figure_answers(
-            self.document, 
+            figures_text,
             self.figure_count_response.total_figures,
             model_name=self.model_name,
             provider=self.provider,
-            api_key=self.api_key
+            api_key=self.api_key,
+            figures=self.figures,
+            events=self.events,
+            transcript=self.transcript,
+            replay_dir=self.replay_dir,
+            info_max_tokens=SHORT_ANSWER_MAX_TOKENS if low else self.stage_max_tokens["figure_info"],
+            connection_max_tokens=SHORT_ANSWER_MAX_TOKENS if low else self.stage_max_tokens["figure_connection"],
+            budget=self.budget
         )
         
-        expanded_answers = expand_figure_answers(
-            self.document,
-            answers,
-            model_name=self.model_name,
-            provider=self.provider,
-            api_key=self.api_key
-        )
+        if self.budget is not None and self.budget.is_low():
+            self.budget.cut("Figures", "expansion skipped")
+            expanded_answers = answers
+        else:
+            expanded_answers = expand_figure_answers(
+                figures_text,
+                answers,
+                model_name=self.model_name,
+                provider=self.provider,
+                api_key=self.api_key,
+                events=self.events,
+                transcript=self.transcript,
+                replay_dir=self.replay_dir,
+                max_tokens=self.stage_max_tokens["expansion"],
+                budget=self.budget
+            )
         
         figures_file = os.path.join(self.output_dir, "figures_analysis.txt")
-        write_analysis_to_file(expanded_answers, figures_file)
+        write_analysis_to_file(expanded_answers, figures_file, events=self.events)
+
+    def write_budget_report(self):
+        """Write the budget usage and any cuts to budget.txt."""
+        with open(os.path.join(self.output_dir, "budget.txt"), 'w', encoding='utf-8') as f:
+            f.write(self.budget.report())
     
     def analyze(self):
-        """Run the complete analysis pipeline."""
+        """
+        Run the complete analysis pipeline, emitting stage_start/stage_end events for each stage.
+        With a profiler, each stage is a top-level section and the profile is written even if the run fails.
+        """
+        stages = [
+            ("Loading document", self.load_document),
+            ("Extracting basic information", self.extract_basic_info),
+            ("Writing metadata", self.write_metadata),
+            ("Analyzing background", self.analyze_background),
+            ("Analyzing figures", self.analyze_figures)
+        ]
+        if self.budget is not None:
+            self.budget.start()
+        if self.profiler is not None:
+            self.profiler.start()
         try:
-            print("Loading document...")
-            self.load_document()
-            
-            print("Extracting basic information...")
-            self.extract_basic_info()
-            
-            print("Writing metadata...")
-            self.write_metadata()
-            
-            print("Analyzing background...")
-            self.analyze_background()
-            
-            print("Analyzing figures...")
-            self.analyze_figures()
-            
-            print("Analysis completed successfully!")
+            for i, (stage, run_stage) in enumerate(stages):
+                with self.events.stage(stage, index=i, total=len(stages)), section(stage):
+                    run_stage()
+
+            if self.budget is not None:
+                self.write_budget_report()
+            self.events.emit(LOG, level="info", message="Analysis completed successfully!")
             
         except Exception as e:
-            print(f"Error during analysis: {str(e)}")
+            self.events.emit(LOG, level="error", message=f"Error during analysis: {str(e)}")
             raise
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+                try:
+                    self.profiler.write(self.output_dir, name=self.base_filename)
+                except Exception as e:
+                    # Don't let a failed profile write replace the analysis' own outcome or error
+                    self.events.emit(LOG, level="error", message=f"Could not write profile: {str(e)}")
+
+    def _query_target(self, provider: str, api_keys: dict = None) -> tuple:
+        """Return the (provider, model_name, api_key) target used for fan-out and hedged queries."""
+        if provider == self.provider:
+            return (self.provider, self.model_name, self.api_key)
+        api_key = (api_keys or {}).get(provider) or os.getenv(API_KEY_ENV_VARS.get(provider, ""))
+        return (provider, MODEL_CONFIGS[provider]["models"][0], api_key)
 
-    def custom_query(self, query: str) -> str:
-        """Process a custom query about the paper."""
+    def custom_query(self, query: str, hedge_provider: str = None, api_keys: dict = None,
+                     hedge_after: float = HEDGE_AFTER_SECONDS) -> str:
+        """
+        Process a custom query about the paper.
+
+        Args:
+            query: The question to answer
+            hedge_provider: Optional backup provider queried when this analyzer's provider has not
+                answered within `hedge_after` seconds; the first answer wins
+            api_keys: Optional provider -> API key mapping for the backup provider
+                (defaults to its environment variable)
+            hedge_after: Seconds to wait before sending the hedged request
+        """
         if not self.document:
             self.load_document()
+
+        if hedge_provider:
+            result = hedged_query(
+                self.document,
+                prompt_template=CUSTOM_QUERY_TEMPLATE,
+                primary=self._query_target(self.provider),
+                backup=self._query_target(hedge_provider, api_keys),
+                hedge_after=hedge_after,
+                expand=True,
+                events=self.events,
+                transcript=self.transcript,
+                replay_dir=self.replay_dir,
+                max_tokens=self.stage_max_tokens["custom_query"],
+                query=query
+            )
+            return result["response"].content
             
         response = query_and_expand(
             self.document,
-            prompt_template=f"""Based on the paper content, please answer the following question:
-            
-            Question: {query}
-            
-            Provide a clear and concise answer based on the paper's content. If the answer cannot be 
-            found in the paper, please indicate that.""",
+            prompt_template=CUSTOM_QUERY_TEMPLATE,
             model_name=self.model_name,
             provider=self.provider,
             api_key=self.api_key,
-            text=self.document
+            events=self.events,
+            transcript=self.transcript,
+            replay_dir=self.replay_dir,
+            max_tokens=self.stage_max_tokens["custom_query"],
+            expansion_max_tokens=self.stage_max_tokens["custom_query"],
+            query=query
         )
         
         return response.content
 
+    def compare_providers(self, query: str, providers: list = None, api_keys: dict = None) -> dict:
+        """
+        Ask the same custom query to several providers concurrently.
+
+        Args:
+            query: The question to answer
+            providers: Providers from MODEL_CONFIGS to query (None: all of them, []: none). This analyzer's
+                provider uses its model; the others use their first listed model
+            api_keys: Optional provider -> API key mapping (defaults to each provider's
+                environment variable)
+
+        Returns:
+            provider -> {"model_name", "answer", "error", "elapsed"}
+        """
+        if providers is None:
+            providers = list(MODEL_CONFIGS)
+        if not providers:
+            return {}
+        if not self.document:
+            self.load_document()
+
+        targets = [self._query_target(provider, api_keys) for provider in providers]
+        results = fan_out_query(
+            self.document,
+            prompt_template=CUSTOM_QUERY_TEMPLATE,
+            targets=targets,
+            expand=True,
+            events=self.events,
+            transcript=self.transcript,
+            replay_dir=self.replay_dir,
+            max_tokens=self.stage_max_tokens["custom_query"],
+            query=query
+        )
+        return {
+            result["provider"]: {
+                "model_name": result["model_name"],
+                "answer": result["response"].content if result["response"] is not None else None,
+                "error": result["error"],
+                "elapsed": result["elapsed"]
+            }
+            for result in results
+        }
+
 def main():
-    dotenv.load_dotenv()
-    
     parser = argparse.ArgumentParser(description="Analyze scientific papers and extract figures information")
     parser.add_argument("pdf_path", help="Path to the PDF file to analyze")
     parser.add_argument("--output-dir", help="Custom output directory", default=OUTPUT_DIR)
     parser.add_argument("--model-name", help="Model name", default=DEFAULT_MODEL)
-    parser.add_argument("--provider", help="Model provider", default=DEFAULT_PROVIDER)
+    parser.add_argument("--provider", default=DEFAULT_PROVIDER,
+                        help=f"Model provider ('{REPLAY_PROVIDER}' answers from recorded transcripts, offline)")
+    parser.add_argument("--api-key", help="API key (defaults to the provider's environment variable)")
+    parser.add_argument("--events-log", help="Append progress events to this JSON-lines file")
+    parser.add_argument("--metrics-file", help="Write Prometheus-format metrics to this file when done")
+    parser.add_argument("--queue", action="store_true",
+                        help="Submit the paper to the background worker queue and wait for the result")
+    parser.add_argument("--record", action="store_true",
+                        help=f"Record every model request and response to {TRANSCRIPT_FILE} in the output directory")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time the run's hot paths; prints a breakdown and writes profile.txt and "
+                             "profile.speedscope.json to the output directory")
+    parser.add_argument("--profile-cprofile", action="store_true",
+                        help="With --profile, also capture cProfile statistics (profile.pstats)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="With --profile, also trace memory allocations with tracemalloc")
+    parser.add_argument("--max-seconds", type=float,
+                        help="Wall-clock budget; later stages are shortened or skipped as it runs out")
+    parser.add_argument("--max-tokens", type=int,
+                        help="Total token budget; later stages are shortened or skipped as it runs out")
     
     args = parser.parse_args()
+    if args.record and args.provider == REPLAY_PROVIDER:
+        parser.error(f"--record cannot be used with --provider {REPLAY_PROVIDER}: "
+                     "it would overwrite the transcript being replayed")
+
+    if args.queue:
+        from worker import JobQueue, FAILED, format_job
+        queue = JobQueue()
+        job_id = queue.submit(args.pdf_path, provider=args.provider, model_name=args.model_name,
+                              output_dir=args.output_dir)
+        print(f"Submitted job {job_id}, waiting for a worker (start one with `python worker.py run`)...")
+        job = queue.wait(job_id, on_update=lambda job: print(format_job(job)))
+        if job["status"] == FAILED:
+            exit(1)
+        return
+
+    import dotenv
+    dotenv.load_dotenv()
+    api_key = args.api_key or os.getenv(API_KEY_ENV_VARS.get(args.provider, ""))
+    
+    events = EventBus()
+    events.subscribe(ConsoleListener())
+    if args.events_log:
+        events.subscribe(JsonLinesListener(args.events_log))
+    metrics = events.subscribe(MetricsListener()) if args.metrics_file else None
+    budget = None
+    if args.max_seconds or args.max_tokens:
+        from budget import AnalysisBudget
+        budget = AnalysisBudget(max_seconds=args.max_seconds, max_tokens=args.max_tokens)
+    profiler = None
+    if args.profile or args.profile_cprofile or args.profile_memory:
+        profiler = Profiler(cprofile=args.profile_cprofile, memory=args.profile_memory)
     
     try:
-        analyzer = PaperAnalyzer(args.pdf_path, args.model_name, args.provider, args.output_dir)
+        analyzer = PaperAnalyzer(args.pdf_path, api_key=api_key, model_name=args.model_name,
+                                 provider=args.provider, output_dir=args.output_dir, events=events,
+                                 budget=budget, record=args.record, profiler=profiler)
         analyzer.analyze()
+        if budget is not None:
+            print(budget.report(), end="")
     except Exception as e:
         print(f"Error during analysis: {str(e)}")
         exit(1)
+    finally:
+        if metrics:
+            metrics.write(args.metrics_file)
+        if profiler is not None and profiler.duration:
+            print(profiler.table(), end="")
 
 if __name__ == "__main__":
     main()
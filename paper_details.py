@@ -0,0 +1,157 @@
+import re
+from collections import Counter
+
+JUNK_METADATA_PATTERN = re.compile(r"^(untitled|microsoft word\b|.*\.(docx?|tex|dvi|pdf)$)", re.IGNORECASE)
+ABSTRACT_PATTERN = re.compile(r"^\s*abstract\b[\s.:—–-]*", re.IGNORECASE)
+ABSTRACT_END_PATTERN = re.compile(
+    r"^\s*((\d+|I)\.?\s+[A-Z]|introduction\b|keywords\b|index terms\b|ccs concepts\b)", re.IGNORECASE
+)
+AFFILIATION_PATTERN = re.compile(
+    r"@|https?://|\b(university|institute|department|dept\.|college|school|laboratory|lab|inc\.|"
+    r"corporation|research|center|centre|google|microsoft|meta|deepmind)\b",
+    re.IGNORECASE
+)
+# Footnote markers and affiliation indices attached to author names
+AUTHOR_MARKER_PATTERN = re.compile(r"[*†‡§¶∗]|(?<=[A-Za-z])\d+(,\d+)*")
+NAME_SEPARATOR_PATTERN = re.compile(r"\s*(?:,|;|&|\band\b)\s*")
+# Lowercase words that may appear inside a person's name
+NAME_PARTICLES = {"van", "von", "der", "den", "de", "del", "della", "da", "di", "du", "la", "le", "bin", "al"}
+
+# Fraction of the first page searched for the title
+TITLE_REGION = 0.4
+TITLE_SIZE_RATIO = 1.2
+MIN_ABSTRACT_CHARS = 150
+MAX_ABSTRACT_CHARS = 5000
+
+
+def _first_page_lines(page):
+    """Return (text, font size) for each line on the page, in reading order."""
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        if block["type"] != 0:
+            continue
+        for line in block["lines"]:
+            spans = [s for s in line["spans"] if s["text"].strip()]
+            if spans:
+                text = " ".join("".join(s["text"] for s in spans).split())
+                lines.append((text, max(s["size"] for s in spans), line["bbox"][1]))
+    return lines
+
+
+def _normalize(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _looks_like_names(text: str) -> bool:
+    """Whether text is a list of person names: capitalised words separated by commas, "and" or "&"."""
+    names = [name for name in NAME_SEPARATOR_PATTERN.split(text) if name]
+    if not names:
+        return False
+    for name in names:
+        tokens = name.split()
+        if not 2 <= len(tokens) <= 5:
+            return False
+        for token in tokens:
+            letters = re.sub(r"[.'’-]", "", token)
+            if token not in NAME_PARTICLES and not (letters.isalpha() and token[0].isupper()):
+                return False
+    return True
+
+
+def _agrees(text: str, reference: str) -> bool:
+    """Whether most words of text also appear in reference."""
+    words = _normalize(text)
+    return bool(words) and len(words & _normalize(reference)) >= 0.6 * len(words)
+
+
+def _clean_metadata(value) -> str:
+    value = (value or "").strip()
+    return "" if len(value) < 3 or JUNK_METADATA_PATTERN.match(value) else value
+
+
+def extract_local_details(pdf_path: str):
+    """
+    Recover the title, authors and abstract from PDF metadata and first-page layout.
+
+    Returns:
+        A (details, confidence) tuple. details has "title", "authors" and "abstract" keys
+        (empty strings when not found); confidence is between 0 and 1.
+    """
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        if len(doc) == 0:
+            return {"title": "", "authors": "", "abstract": ""}, 0.0
+        metadata = doc.metadata or {}
+        page = doc[0]
+        lines = _first_page_lines(page)
+        page_height = page.rect.height
+
+    if not lines:
+        return {"title": "", "authors": "", "abstract": ""}, 0.0
+
+    size_counts = Counter()
+    for text, size, _ in lines:
+        size_counts[round(size, 1)] += len(text)
+    body_size = size_counts.most_common(1)[0][0]
+
+    # Title: the run of largest-font lines near the top of the page
+    top_lines = [(i, line) for i, line in enumerate(lines) if line[2] <= page_height * TITLE_REGION]
+    title, title_end = "", -1
+    if top_lines:
+        title_size = max(line[1] for _, line in top_lines)
+        if title_size >= body_size * TITLE_SIZE_RATIO:
+            title_indices = [i for i, line in top_lines if line[1] >= title_size - 0.5]
+            first = title_indices[0]
+            title_end = first
+            while title_end + 1 < len(lines) and lines[title_end + 1][1] >= title_size - 0.5:
+                title_end += 1
+            title = " ".join(lines[i][0] for i in range(first, title_end + 1))
+
+    # Abstract: from the "Abstract" marker to the first heading or keywords line
+    abstract_start = next((i for i, line in enumerate(lines) if ABSTRACT_PATTERN.match(line[0])), None)
+    abstract = ""
+    if abstract_start is not None:
+        parts = [ABSTRACT_PATTERN.sub("", lines[abstract_start][0], count=1)]
+        for text, size, _ in lines[abstract_start + 1:]:
+            if ABSTRACT_END_PATTERN.match(text) or size >= body_size * TITLE_SIZE_RATIO:
+                break
+            parts.append(text)
+        abstract = " ".join(p for p in parts if p)
+        abstract = re.sub(r"(\w)- (\w)", r"\1\2", abstract)  # re-join hyphenated line breaks
+
+    metadata_title = _clean_metadata(metadata.get("title"))
+    metadata_authors = _clean_metadata(metadata.get("author"))
+
+    # Authors: lines between the title and the abstract that read as person names (or match the
+    # metadata authors), skipping affiliations, dates, arXiv identifiers and venue notes
+    author_lines = []
+    if title:
+        end = abstract_start if abstract_start is not None else min(len(lines), title_end + 6)
+        for text, size, _ in lines[title_end + 1:end]:
+            if AFFILIATION_PATTERN.search(text) or ABSTRACT_END_PATTERN.match(text):
+                continue
+            cleaned = " ".join(AUTHOR_MARKER_PATTERN.sub("", text).split()).strip(" ,;")
+            if cleaned and len(cleaned) < 300 and (
+                    _looks_like_names(cleaned) or (metadata_authors and _agrees(cleaned, metadata_authors))):
+                author_lines.append(cleaned)
+            if len(author_lines) == 3:
+                break
+    authors = ", ".join(author_lines)
+
+    title_agrees = bool(title and metadata_title) and _agrees(title, metadata_title)
+    title = title or metadata_title
+    authors = authors or metadata_authors
+
+    confidence = 0.0
+    if title and 10 <= len(title) <= 300:
+        confidence += 0.35 + (0.05 if title_agrees else 0.0)
+    # Metadata authors only count when they read as names
+    if author_lines or (authors and _looks_like_names(authors)):
+        confidence += 0.25
+    if MIN_ABSTRACT_CHARS <= len(abstract) <= MAX_ABSTRACT_CHARS:
+        confidence += 0.35
+    elif abstract:
+        confidence += 0.1
+
+    return {"title": title, "authors": authors, "abstract": abstract}, round(min(confidence, 1.0), 2)
@@ -0,0 +1,80 @@
+import math
+import multiprocessing
+import os
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+from config import EXTRACT_WORKERS
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> list:
+    """Open the PDF in this worker and return the text of pages [start, stop), as extracted."""
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def page_count(pdf_path: str) -> int:
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        return len(doc)
+
+
+def extract_pages(pdf_path: str, workers: int = EXTRACT_WORKERS) -> list:
+    """
+    Return the text of every page, extracting page ranges on a process pool.
+
+    Each worker opens the document itself, so nothing but the path and page numbers is
+    sent between processes. Pages are returned in document order.
+
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Number of processes (default: one per CPU); 1 extracts in this process
+    """
+    total = page_count(pdf_path)
+    workers = min(workers or os.cpu_count() or 1, total) if total else 1
+    if workers <= 1:
+        return _extract_page_range(pdf_path, 0, total)
+
+    # A few ranges per worker so an expensive stretch of pages does not leave others idle
+    size = max(1, math.ceil(total / (workers * 4)))
+    ranges = [(start, min(start + size, total)) for start in range(0, total, size)]
+    # Forked workers would inherit the parent's threads and locks (the app and worker run
+    # analyses on threads), so start them from a clean interpreter instead
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(_extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+    return pages
+
+
+def load_pdf_documents(pdf_path: str, workers: int = EXTRACT_WORKERS) -> list:
+    """
+    Load the PDF as one LangChain Document per page, like PyMuPDFLoader, using parallel extraction.
+
+    The metadata and page text match what the installed PyMuPDFLoader produces: its first page
+    is loaded with the loader itself, which supplies the metadata (whose keys and formatting
+    differ between langchain-community versions). Whether page text is stripped is read from the
+    loader's first page with text, since a blank page looks the same either way.
+    """
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain_core.documents import Document
+
+    pages = extract_pages(pdf_path, workers)
+    if not pages:
+        return []
+    loaded = PyMuPDFLoader(pdf_path).lazy_load()
+    first = next(loaded)
+    metadata = {k: v for k, v in first.metadata.items() if k != "page"}
+    text_page = next((i for i, text in enumerate(pages) if text.strip()), None)
+    if text_page is not None:
+        sample = first if text_page == 0 else next(islice(loaded, text_page - 1, None))
+        if sample.page_content != pages[text_page]:
+            pages = [text.strip() for text in pages]
+
+    return [Document(page_content=text, metadata={**metadata, "page": i}) for i, text in enumerate(pages)]
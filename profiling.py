@@ -0,0 +1,216 @@
+import contextvars
+import functools
+import io
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from config import PROFILE_TOP_FUNCTIONS
+
+# The profiler of the run in this context; None when profiling is off
+_active = contextvars.ContextVar("profiler", default=None)
+_NOT_PROFILING = nullcontext()
+
+
+def section(name: str):
+    """
+    Time the enclosed block as `name` on the profiler of the current run.
+
+    Sections nest per thread. When no profiler is running this returns a shared no-op
+    context manager, so hot paths can stay instrumented.
+    """
+    profiler = _active.get()
+    if profiler is None:
+        return _NOT_PROFILING
+    return _Section(profiler, name)
+
+
+def profiled(name: str):
+    """Decorator timing every call of the function as section `name`."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def propagate(function):
+    """
+    Wrap `function` to run in a copy of the caller's context, so that sections in executor
+    threads report to the profiler of the run that submitted them.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets its own copy
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
+
+
+class _Section:
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._record("O", self.name)
+
+    def __exit__(self, *exc):
+        self.profiler._record("C", self.name)
+
+
+class Profiler:
+    """
+    Collect section timings for one run, optionally with cProfile and tracemalloc.
+
+    Profiling is scoped to the context that starts it: sections in the starting thread, and in
+    executor tasks submitted through `propagate`, report here, so concurrent runs each get their
+    own breakdown. cProfile only sees the thread that started it (the analysis' main thread); the
+    LLM requests made from executor threads are covered by the section timers. tracemalloc is
+    process-wide, so only one run at a time can trace memory.
+    """
+
+    def __init__(self, cprofile: bool = False, memory: bool = False):
+        self.cprofile = cprofile
+        self.memory = memory
+        self.events = []  # (thread name, "O" or "C", section name, seconds since start)
+        self.duration = 0.0
+        self.peak_memory = None
+        self._started = None
+        self._profile = None
+        self._memory_snapshot = None
+        self._token = None
+
+    def _record(self, kind: str, name: str) -> None:
+        # list.append is atomic, so threads can record without a lock
+        self.events.append((threading.current_thread().name, kind, name, time.perf_counter() - self._started))
+
+    def start(self) -> None:
+        """Start profiling the current context. Raises RuntimeError if memory is already being traced."""
+        if self.memory:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is already tracing; memory can be profiled for one run at a time")
+            tracemalloc.start()
+        if self.cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+        self._token = _active.set(self)
+
+    def stop(self) -> None:
+        """Stop profiling; call from the context (thread) that started the profiler."""
+        _active.reset(self._token)
+        self._token = None
+        self.duration = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        if self.memory:
+            import tracemalloc
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            self._memory_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def _thread_spans(self) -> dict:
+        """Return thread -> [(name, start, end, self seconds)] for every closed section."""
+        spans, stacks = {}, {}
+        for thread, kind, name, at in self.events:
+            stack = stacks.setdefault(thread, [])
+            if kind == "O":
+                stack.append([name, at, 0.0])
+            elif stack:
+                name, start, children = stack.pop()
+                elapsed = at - start
+                if stack:
+                    stack[-1][2] += elapsed
+                spans.setdefault(thread, []).append((name, start, at, elapsed - children))
+        return spans
+
+    def breakdown(self) -> list:
+        """Return per-section rows (name, calls, total, self, max) sorted by total time."""
+        totals = {}
+        for spans in self._thread_spans().values():
+            for name, start, end, own in spans:
+                row = totals.setdefault(name, [name, 0, 0.0, 0.0, 0.0])
+                row[1] += 1
+                row[2] += end - start
+                row[3] += own
+                row[4] = max(row[4], end - start)
+        return sorted((tuple(row) for row in totals.values()), key=lambda row: row[2], reverse=True)
+
+    def table(self) -> str:
+        """Format the breakdown as a text table. Sections in worker threads overlap, so totals can exceed the run."""
+        lines = [f"{'Section':<32} {'Calls':>6} {'Total s':>9} {'Self s':>9} {'Mean ms':>9} {'Max ms':>9} {'% run':>6}"]
+        for name, calls, total, own, longest in self.breakdown():
+            share = 100 * total / self.duration if self.duration else 0.0
+            lines.append(f"{name[:32]:<32} {calls:>6} {total:>9.3f} {own:>9.3f} {1000 * total / calls:>9.1f} "
+                         f"{1000 * longest:>9.1f} {share:>6.1f}")
+        lines.append(f"Run: {self.duration:.3f}s")
+        if self.peak_memory is not None:
+            lines.append(f"Peak traced memory: {self.peak_memory / 2 ** 20:.1f} MiB")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str = "paper-analyzer") -> dict:
+        """Return the sections as a speedscope evented profile, one profile per thread."""
+        frames, frame_index, profiles = [], {}, []
+        by_thread, stacks = {}, {}
+        for thread, kind, section_name, at in self.events:
+            if section_name not in frame_index:
+                frame_index[section_name] = len(frames)
+                frames.append({"name": section_name})
+            frame = frame_index[section_name]
+            stack = stacks.setdefault(thread, [])
+            if kind == "O":
+                stack.append(frame)
+            elif stack:
+                stack.pop()
+            else:
+                continue
+            by_thread.setdefault(thread, []).append({"type": kind, "frame": frame, "at": at})
+        for thread, events in by_thread.items():
+            end = max(self.duration, events[-1]["at"])
+            # Close sections still open when the profiler stopped, innermost first
+            events.extend({"type": "C", "frame": frame, "at": end} for frame in reversed(stacks[thread]))
+            profiles.append({"type": "evented", "name": thread, "unit": "seconds",
+                             "startValue": 0, "endValue": end, "events": events})
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "paper-analyzer",
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+    def report(self) -> str:
+        """Return the breakdown table followed by the cProfile and tracemalloc summaries, when captured."""
+        parts = [self.table()]
+        if self._profile is not None:
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            parts.append(f"cProfile (main thread), top {PROFILE_TOP_FUNCTIONS} by cumulative time:\n{stream.getvalue()}")
+        if self._memory_snapshot is not None:
+            stats = self._memory_snapshot.statistics("lineno")[:PROFILE_TOP_FUNCTIONS]
+            parts.append("Largest allocations still held at the end of the run:\n"
+                         + "\n".join(str(stat) for stat in stats) + "\n")
+        return "\n".join(parts)
+
+    def write(self, output_dir: str, name: str = "paper-analyzer") -> list:
+        """Write profile.txt, profile.speedscope.json and (with cProfile) profile.pstats; return their paths."""
+        paths = [os.path.join(output_dir, "profile.txt"), os.path.join(output_dir, "profile.speedscope.json")]
+        with open(paths[0], 'w', encoding='utf-8') as f:
+            f.write(self.report())
+        with open(paths[1], 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(name), f, separators=(",", ":"))
+        if self._profile is not None:
+            paths.append(os.path.join(output_dir, "profile.pstats"))
+            self._profile.dump_stats(paths[-1])
+        return paths
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+
+
+class FiguresCount(BaseModel):
+    total_figures: int = Field(description="Total number of figures in the paper")
+
+
+class PaperDetails(BaseModel):
+    title: str = Field(description="Title of the paper")
+    abstract: str = Field(description="Abstract of the paper")
+    authors: str = Field(description="Authors of the paper")
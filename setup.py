@@ -4,6 +4,24 @@ setup(
     name="academic_paper_analyzer",
     version="0.1",
     packages=find_packages(),
+    py_modules=[
+        "paper_analyzer",
+        "config",
+        "models",
+        "schemas",
+        "templates",
+        "utils",
+        "figures",
+        "document_model",
+        "paper_details",
+        "corpus",
+        "pdf_loader",
+        "events",
+        "worker",
+        "budget",
+        "transcript",
+        "profiling"
+    ],
     install_requires=[
         "openai",
         "python-dotenv",
@@ -15,4 +33,10 @@ setup(
         "langchain-community",
         "pymupdf"
     ],
-)
\ No newline at end of file
+    entry_points={
+        "console_scripts": [
+            "paper-analyzer=paper_analyzer:main",
+            "paper-corpus=corpus:main"
+        ]
+    },
+)
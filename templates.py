@@ -58,3 +58,31 @@ Extract and summarize the background information from the following text in a de
 
 => Respond only with the requested information above. Ensure clarity, precision, and completeness to facilitate comprehensive understanding.
 """
+
+
+FIGURE_VISION_TEMPLATE = """
+I have to present a figure to my class. The attached image is figure {figure_number} of an academic paper.
+Explain to me in detail what the figure is about. Be meticulous and detailed and logical.
+
+Caption: {caption}
+
+Describe what is actually shown (axes, panels, labels, trends) and then explain what the figure demonstrates."""
+
+
+CUSTOM_QUERY_TEMPLATE = """Based on the paper content, please answer the following question:
+
+Question: {query}
+
+Provide a clear and concise answer based on the paper's content. If the answer cannot be
+found in the paper, please indicate that."""
+
+
+CORPUS_QUERY_TEMPLATE = """
+Answer the following question using the passages below, taken from several academic papers.
+Each passage starts with [paper | source]. Compare the papers where relevant and cite the paper
+name for every claim. If the passages do not contain the answer, say so.
+
+Question: {question}
+
+Passages:
+{text}"""
@@ -0,0 +1,99 @@
+import pytest
+import utils
+from budget import AnalysisBudget
+from events import Event, EventBus, LLM_CALL, BUDGET_CUT
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+def test_budget_counts_tokens_from_events():
+    """Test that the budget tracks reported tokens and turns low, then exhausted"""
+    events = EventBus()
+    budget = events.subscribe(AnalysisBudget(max_tokens=1000, low_fraction=0.3, events=events))
+    budget.start()
+
+    events.emit(LLM_CALL, provider="openai", model_name="gpt-4o", duration=1.0, structured=False, tokens=600)
+    events.emit(LLM_CALL, provider="openai", model_name="gpt-4o", duration=1.0, structured=True, tokens=None)
+    assert budget.tokens_used == 600
+    assert not budget.is_low()
+
+    events.emit(LLM_CALL, provider="openai", model_name="gpt-4o", duration=1.0, structured=False, tokens=200)
+    assert budget.is_low()
+    assert not budget.is_exhausted()
+
+    events.emit(LLM_CALL, provider="openai", model_name="gpt-4o", duration=1.0, structured=False, tokens=500)
+    assert budget.is_exhausted()
+    assert budget.remaining_fraction() == 0.0
+
+
+def test_unlimited_budget_never_runs_out():
+    budget = AnalysisBudget()
+    budget.start()
+    budget(Event(LLM_CALL, 0.0, {"tokens": 10 ** 9}))
+    assert budget.remaining_fraction() == 1.0
+    assert "Nothing was cut." in budget.report()
+
+
+def test_exhausted_budget_skips_figures(monkeypatch):
+    """Test that figures reached after the budget is exhausted are skipped and reported"""
+    calls = []
+
+    def fake_query_document(document, prompt_template=None, model_name=None, provider=None,
+                            api_key=None, pydantic_model=None, events=None, **prompt_variables):
+        calls.append(prompt_variables)
+        return FakeResponse("answer")
+
+    monkeypatch.setattr(utils, "query_document", fake_query_document)
+    events = EventBus()
+    cuts = []
+    events.subscribe(lambda event: cuts.append(event) if event.type == BUDGET_CUT else None)
+    budget = AnalysisBudget(max_tokens=100, events=events)
+    budget.start()
+    budget.tokens_used = 100
+
+    answers = utils.process_figure_answers("doc", 2, api_key="key", events=events, budget=budget)
+
+    assert calls == []
+    assert answers[0]["Information"].content.startswith("[Not generated")
+    assert sorted(event.data["stage"] for event in cuts) == ["Figure 1", "Figure 2"]
+    assert "Figure 1: analysis skipped" in budget.report()
+
+
+@pytest.mark.parametrize("max_tokens", [None, 256])
+def test_stage_token_caps_reach_the_query(monkeypatch, max_tokens):
+    """Test that per-stage caps are passed down to each figure query"""
+    seen = []
+
+    def fake_query_document(document, prompt_template=None, model_name=None, provider=None,
+                            api_key=None, pydantic_model=None, events=None, max_tokens=None,
+                            **prompt_variables):
+        seen.append(max_tokens)
+        return FakeResponse("answer")
+
+    monkeypatch.setattr(utils, "query_document", fake_query_document)
+    utils.process_figure_answers("doc", 1, api_key="key", info_max_tokens=max_tokens,
+                                 connection_max_tokens=max_tokens)
+    assert seen == [max_tokens, max_tokens]
+
+
+def test_custom_query_cap_reaches_the_query(tmp_path, monkeypatch):
+    """Test that the custom_query cap applies to custom queries and provider comparisons"""
+    from paper_analyzer import PaperAnalyzer
+
+    seen = []
+
+    def fake_query_document(document, prompt_template=None, max_tokens=None, **kwargs):
+        seen.append(max_tokens)
+        return FakeResponse("answer")
+
+    monkeypatch.setattr(utils, "query_document", fake_query_document)
+    analyzer = PaperAnalyzer(str(tmp_path / "paper.pdf"), api_key="key", model_name="gpt-4o", provider="openai",
+                             output_dir=str(tmp_path), stage_max_tokens={"custom_query": 300})
+    analyzer.document = "paper text"
+
+    analyzer.custom_query("What is new?")
+    analyzer.compare_providers("What is new?", providers=["openai"])
+    assert seen == [300] * 4  # each answer and its expansion
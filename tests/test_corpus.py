@@ -0,0 +1,115 @@
+import os
+import sys
+import pytest
+import utils
+import corpus
+from corpus import build_corpus_index, CorpusIndex, query_corpus, open_corpus_index
+
+
+def write_paper(output_dir, name, metadata, background):
+    paper_dir = os.path.join(output_dir, name)
+    os.makedirs(paper_dir)
+    with open(os.path.join(paper_dir, "metadata.txt"), 'w', encoding='utf-8') as f:
+        f.write(metadata)
+    with open(os.path.join(paper_dir, "background.txt"), 'w', encoding='utf-8') as f:
+        f.write(background)
+
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    """Create an output directory with three analyzed papers and index it"""
+    output_dir = str(tmp_path / "output")
+    write_paper(output_dir, "widgets", "Title: Deep Widgets", "Widgets are trained with gradient descent on gadget data.")
+    write_paper(output_dir, "gadgets", "Title: Gadget Survey", "A survey of gadget taxonomies and gadget benchmarks.")
+    write_paper(output_dir, "proteins", "Title: Protein Folding", "Protein structures are predicted with attention models.")
+    os.makedirs(os.path.join(output_dir, "empty"))
+    index_dir = str(tmp_path / "index")
+    stats = build_corpus_index(output_dir, index_dir, chunk_words=50)
+    assert stats["papers"] == 3
+    return index_dir
+
+
+def test_search_ranks_relevant_chunks(corpus_dir):
+    """Test BM25 ranking and paper filtering over the memory-mapped index"""
+    with CorpusIndex(corpus_dir) as index:
+        hits = index.search("gadget benchmarks", top_k=2)
+        assert hits[0]["paper"] == "gadgets"
+        assert hits[0]["source"] == "background"
+        assert hits[0]["score"] > hits[1]["score"]
+
+        filtered = index.search("gadget", papers=["widgets"])
+        assert {hit["paper"] for hit in filtered} == {"widgets"}
+
+        assert index.search("nonexistentterm") == []
+
+
+def test_query_corpus_sends_only_top_hits(corpus_dir, monkeypatch):
+    """Test that only the retrieved passages are sent to the model"""
+    captured = {}
+
+    class FakeResponse:
+        content = "Protein folding uses attention."
+
+    def fake_query_document(document, **kwargs):
+        captured["document"] = document
+        captured["question"] = kwargs["question"]
+        return FakeResponse()
+
+    monkeypatch.setattr(utils, "query_document", fake_query_document)
+    answer, hits = query_corpus("protein attention", corpus_dir, top_k=1, api_key="key")
+
+    assert answer == "Protein folding uses attention."
+    assert len(hits) == 1
+    assert "[proteins | background]" in captured["document"]
+    assert "gadget" not in captured["document"]
+
+
+def test_index_is_opened_once_until_rebuilt(corpus_dir, tmp_path):
+    """Test that queries share one open index, which is reopened after a rebuild"""
+    index = open_corpus_index(corpus_dir)
+    assert open_corpus_index(corpus_dir) is index
+    hits = index.search("protein")
+
+    write_paper(str(tmp_path / "output"), "robots", "Title: Robots", "Robots assemble protein widgets.")
+    build_corpus_index(str(tmp_path / "output"), corpus_dir, chunk_words=50)
+    reopened = open_corpus_index(corpus_dir)
+
+    assert reopened is not index
+    assert "robots" in reopened.papers
+    assert index.search("protein") == hits  # the old index stays readable
+    assert not [name for name in os.listdir(corpus_dir) if name.endswith(".tmp")]
+
+
+def test_rebuild_swaps_whole_builds(corpus_dir, tmp_path, monkeypatch):
+    """Test that a failed build leaves the live index alone and only the previous build is kept"""
+    first = CorpusIndex(corpus_dir).build
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(corpus, "_chunk_words", fail)
+        with pytest.raises(OSError):
+            build_corpus_index(str(tmp_path / "output"), corpus_dir, chunk_words=50)
+    assert corpus.current_build(corpus_dir) == first
+    assert os.listdir(os.path.join(corpus_dir, corpus.BUILDS_DIR)) == [first]
+
+    build_corpus_index(str(tmp_path / "output"), corpus_dir, chunk_words=50)
+    second = corpus.current_build(corpus_dir)
+    build_corpus_index(str(tmp_path / "output"), corpus_dir, chunk_words=50)
+    third = corpus.current_build(corpus_dir)
+
+    assert len({first, second, third}) == 3
+    assert sorted(os.listdir(os.path.join(corpus_dir, corpus.BUILDS_DIR))) == sorted([second, third])
+    with CorpusIndex(corpus_dir, second) as previous, CorpusIndex(corpus_dir) as current:
+        assert previous.papers == current.papers
+
+
+def test_search_only_without_index(tmp_path, monkeypatch, capsys):
+    """Test that a missing index is reported without a traceback"""
+    index_dir = str(tmp_path / "missing")
+    monkeypatch.setattr(sys, "argv", ["corpus.py", "--index-dir", index_dir, "query", "widgets", "--search-only"])
+    with pytest.raises(SystemExit):
+        corpus.main()
+    assert capsys.readouterr().out == (f"Error querying corpus: No corpus index in {index_dir}; "
+                                       "build one with `python corpus.py build`\n")
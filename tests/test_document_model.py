@@ -0,0 +1,91 @@
+import os
+import pymupdf
+import pytest
+from document_model import parse_document, load_document_model, DocumentModel
+from events import EventBus, CACHE_HIT
+
+
+@pytest.fixture
+def structured_pdf(tmp_path):
+    """Create a two-page PDF with a title, numbered headings, a caption and references"""
+    pdf_path = str(tmp_path / "structured_paper.pdf")
+    doc = pymupdf.open()
+    lines = [
+        [("Deep Widgets for Everyone", 20, False), ("Ada Lovelace, Alan Turing", 11, False),
+         ("Abstract", 12, True), ("We present widgets that are deep and useful for everyone.", 10, False),
+         ("1 Introduction", 12, True), ("Widgets have a long history in the field of gadgets.", 10, False),
+         ("2 Related Work", 12, True), ("Prior work studied shallow widgets in many settings.", 10, False)],
+        [("3 Results", 12, True), ("Our widgets outperform all baselines by a wide margin.", 10, False),
+         ("Figure 1 shows that deeper widgets are more accurate.", 10, False),
+         ("3.1 Ablations", 11, True), ("Removing depth hurts performance considerably.", 10, False),
+         ("Figure 1: Accuracy of deep widgets versus depth.", 10, False),
+         ("4 Conclusion", 12, True), ("Deep widgets are good for everyone.", 10, False),
+         ("References", 12, True), ("[1] A. Author. Shallow widgets. 2020.", 10, False)]
+    ]
+    for page_lines in lines:
+        page = doc.new_page()
+        y = 72
+        for text, size, bold in page_lines:
+            page.insert_text((72, y), text, fontsize=size, fontname="hebo" if bold else "helv")
+            y += size * 2.2
+    doc.save(pdf_path)
+    doc.close()
+    return pdf_path
+
+
+def test_parse_sections(structured_pdf):
+    """Test that headings, levels, captions and references are recognised"""
+    model = parse_document(structured_pdf)
+
+    assert model.title == "Deep Widgets for Everyone"
+    assert model.page_count == 2
+    titles = [(s.title, s.level, s.page) for s in model.sections[1:]]
+    assert titles == [("Abstract", 1, 0), ("1 Introduction", 1, 0), ("2 Related Work", 1, 0),
+                      ("3 Results", 1, 1), ("3.1 Ablations", 2, 1), ("4 Conclusion", 1, 1),
+                      ("References", 1, 1)]
+    assert [(c.kind, c.number, c.page) for c in model.captions] == [("figure", 1, 1)]
+    assert model.references[0].text.startswith("[1]")
+
+
+def test_select_includes_subsections(structured_pdf):
+    """Test that selecting a section also returns its subsections only"""
+    model = parse_document(structured_pdf)
+    text = model.select("results")
+
+    assert "outperform all baselines" in text
+    assert "Figure 1 shows that deeper widgets" in text  # a results paragraph, not a caption
+    assert "Removing depth" in text
+    assert "Conclusion" not in text
+    assert "Widgets for Everyone" in model.page_text(0)
+    assert "outperform" not in model.page_text(0)
+
+
+def test_model_is_cached(structured_pdf, tmp_path):
+    """Test that the parsed model round-trips through the on-disk cache"""
+    cache_path = str(tmp_path / "structure.json")
+    events = EventBus()
+    received = []
+    events.subscribe(received.append)
+    first = load_document_model(structured_pdf, cache_path, events=events)
+    assert os.path.exists(cache_path)
+    assert received == []
+
+    second = load_document_model(structured_pdf, cache_path, events=events)
+    assert [(e.type, e.data["cache"]) for e in received] == [(CACHE_HIT, "structure")]
+    assert isinstance(second, DocumentModel)
+    assert second.to_dict() == first.to_dict()
+    assert not hasattr(second.sections[0], "__dict__")
+
+
+def test_stage_text_falls_back_to_text(tmp_path):
+    """Test that stages get the paper's text, not the loaded Documents, when the structure is unavailable"""
+    from langchain_core.documents import Document
+    from paper_analyzer import PaperAnalyzer
+
+    analyzer = PaperAnalyzer(str(tmp_path / "paper.pdf"), api_key="key", model_name="gpt-4o",
+                             provider="openai", output_dir=str(tmp_path))
+    analyzer.document = [Document(page_content="Deep widgets are good.", metadata={"page": 0})]
+
+    for stage in ("details", "figure_count", "background", "figures"):
+        text = analyzer.stage_text(stage)
+        assert isinstance(text, str) and "Deep widgets are good." in text
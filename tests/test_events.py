@@ -0,0 +1,55 @@
+import json
+import pytest
+from events import (EventBus, JsonLinesListener, MetricsListener, ProgressListener,
+                    STAGE_START, STAGE_END, LLM_CALL, FIGURE_COMPLETED)
+
+
+def test_stage_events():
+    """Test that stages emit start and end events with duration and status"""
+    events = EventBus()
+    received = []
+    events.subscribe(received.append)
+
+    with events.stage("Loading document", index=0, total=2):
+        pass
+    with pytest.raises(RuntimeError):
+        with events.stage("Analyzing figures", index=1, total=2):
+            raise RuntimeError("boom")
+
+    assert [e.type for e in received] == [STAGE_START, STAGE_END, STAGE_START, STAGE_END]
+    assert received[1].data["status"] == "ok"
+    assert received[1].data["duration"] >= 0
+    assert received[3].data["status"] == "error"
+
+
+def test_progress_listener():
+    """Test that figure events advance progress within the current stage"""
+    updates = []
+    events = EventBus()
+    events.subscribe(ProgressListener(lambda label, fraction: updates.append((label, fraction))))
+
+    events.emit(STAGE_START, stage="Analyzing figures", index=1, total=2)
+    events.emit(FIGURE_COMPLETED, figure_number=1, completed=1, total=2)
+
+    assert updates[0] == ("Analyzing figures", 0.5)
+    assert updates[1][1] == pytest.approx(0.625)
+
+
+def test_json_lines_and_metrics(tmp_path):
+    """Test the JSON-lines log and Prometheus metrics output"""
+    log_path = tmp_path / "events.jsonl"
+    events = EventBus()
+    events.subscribe(JsonLinesListener(str(log_path)))
+    metrics = events.subscribe(MetricsListener())
+
+    events.emit(LLM_CALL, provider="openai", model_name="gpt-4o", duration=0.7)
+    with events.stage("Writing metadata"):
+        pass
+
+    lines = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [line["type"] for line in lines] == [LLM_CALL, STAGE_START, STAGE_END]
+
+    rendered = metrics.render()
+    assert 'paper_analyzer_llm_call_seconds_bucket{le="1"} 1' in rendered
+    assert 'paper_analyzer_llm_call_seconds_bucket{le="0.5"} 0' in rendered
+    assert 'paper_analyzer_stage_seconds_count{stage="Writing metadata"} 1' in rendered
@@ -0,0 +1,125 @@
+import time
+import pytest
+import utils
+from events import EventBus, HEDGE
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    """Replace live LLM calls with per-provider delays and failures"""
+    delays = {"openai": 0.0, "openrouter": 0.0, "gemini": 0.0}
+    failing = set()
+
+    def fake_query_document(document, prompt_template=None, model_name=None, provider=None,
+                            api_key=None, pydantic_model=None, events=None, **prompt_variables):
+        time.sleep(delays[provider])
+        if provider in failing:
+            raise RuntimeError(f"{provider} unavailable")
+        return FakeResponse(f"{provider} answer")
+
+    monkeypatch.setattr(utils, "query_document", fake_query_document)
+    return delays, failing
+
+
+TARGETS = [("openai", "gpt-4o", "k1"), ("openrouter", "google/gemini-exp-1114", "k2"), ("gemini", "gemini-1.5-flash", "k3")]
+
+
+def test_fan_out_runs_concurrently(fake_providers):
+    """Test that fan-out queries run in parallel and report per-provider results"""
+    delays, failing = fake_providers
+    delays.update(openai=0.3, openrouter=0.3, gemini=0.3)
+    failing.add("gemini")
+
+    start = time.perf_counter()
+    results = utils.fan_out_query("doc", "{text}", TARGETS)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.8
+    assert [r["provider"] for r in results] == ["openai", "openrouter", "gemini"]
+    assert results[0]["response"].content == "openai answer"
+    assert results[0]["elapsed"] >= 0.3
+    assert results[2]["response"] is None
+    assert "unavailable" in results[2]["error"]
+
+
+def test_hedged_query_uses_fast_primary(fake_providers):
+    """Test that no hedge is sent when the primary answers in time"""
+    events = EventBus()
+    received = []
+    events.subscribe(received.append)
+
+    result = utils.hedged_query("doc", "{text}", TARGETS[0], TARGETS[1], hedge_after=0.5, events=events)
+    assert result["provider"] == "openai"
+    assert result["hedged"] is False
+    assert not [e for e in received if e.type == HEDGE]
+
+
+def test_hedged_query_backup_wins(fake_providers):
+    """Test that a slow primary is hedged and the backup answer is returned"""
+    delays, _ = fake_providers
+    delays["openrouter"] = 1.0
+
+    start = time.perf_counter()
+    result = utils.hedged_query("doc", "{text}", TARGETS[1], TARGETS[0], hedge_after=0.1)
+    assert time.perf_counter() - start < 0.8
+    assert result["provider"] == "openai"
+    assert result["hedged"] is True
+
+
+def test_hedged_query_all_fail(fake_providers):
+    """Test that an error is raised when both targets fail"""
+    _, failing = fake_providers
+    failing.update({"openai", "openrouter"})
+    with pytest.raises(RuntimeError):
+        utils.hedged_query("doc", "{text}", TARGETS[0], TARGETS[1], hedge_after=0.1)
+
+
+def test_fan_out_without_targets():
+    """Test that fanning out to no providers returns no results instead of failing"""
+    assert utils.fan_out_query("doc", "{text}", []) == []
+
+
+def test_compare_providers_offline(tmp_path, monkeypatch):
+    """Test compare_providers end to end with stub chat models standing in for each provider"""
+    from langchain_core.documents import Document
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from paper_analyzer import PaperAnalyzer
+
+    def stub_chat_model(provider, model_name, *args):
+        def answer(prompt):
+            if provider == "gemini":
+                raise RuntimeError("gemini unavailable")
+            return AIMessage(content=f"{provider} answer")
+        return RunnableLambda(answer)
+
+    monkeypatch.setattr(utils, "get_chat_model", stub_chat_model)
+    utils._chain.cache_clear()
+    try:
+        analyzer = PaperAnalyzer(str(tmp_path / "paper.pdf"), api_key="k1", model_name="gpt-4o",
+                                 provider="openai", output_dir=str(tmp_path))
+        analyzer.document = [Document(page_content="A paper about widgets.", metadata={"page": 0})]
+        results = analyzer.compare_providers("What is it about?", providers=["openai", "openrouter", "gemini"],
+                                             api_keys={"openrouter": "k2", "gemini": "k3"})
+    finally:
+        utils._chain.cache_clear()
+
+    assert list(results) == ["openai", "openrouter", "gemini"]
+    assert results["openai"] == {"model_name": "gpt-4o", "answer": "openai answer", "error": None,
+                                 "elapsed": results["openai"]["elapsed"]}
+    assert results["openrouter"]["answer"] == "openrouter answer"
+    assert results["gemini"]["answer"] is None and "unavailable" in results["gemini"]["error"]
+
+
+def test_compare_no_providers(tmp_path):
+    """Test that an explicitly empty provider list queries nothing instead of every provider"""
+    from paper_analyzer import PaperAnalyzer
+
+    analyzer = PaperAnalyzer(str(tmp_path / "paper.pdf"), api_key="k1", model_name="gpt-4o",
+                             provider="openai", output_dir=str(tmp_path))
+    assert analyzer.compare_providers("What is it about?", providers=[]) == {}
@@ -0,0 +1,74 @@
+import os
+import pymupdf
+import pytest
+from figures import FigureExtractor
+from models import supports_vision
+
+
+@pytest.fixture
+def figure_pdf(tmp_path):
+    """Create a one-page PDF with a drawn figure and its caption"""
+    pdf_path = str(tmp_path / "figure_paper.pdf")
+    doc = pymupdf.open()
+    page = doc.new_page()
+    page.insert_text((72, 80), "Some introductory paragraph text.")
+    page.draw_rect(pymupdf.Rect(100, 120, 400, 320), color=(0, 0, 1), fill=(0.8, 0.8, 1))
+    page.draw_line((120, 300), (380, 140))
+    page.insert_text((100, 340), "Figure 1: A rising line inside a box.")
+    doc.save(pdf_path)
+    doc.close()
+    return pdf_path
+
+
+def test_extract_figure_crop(figure_pdf, tmp_path):
+    """Test that a captioned figure is located and rendered within size limits"""
+    extractor = FigureExtractor(figure_pdf, str(tmp_path / "out"), dpi=144, max_size=200)
+    figures = extractor.extract()
+
+    assert list(figures) == [1]
+    figure = figures[1]
+    assert figure.caption.startswith("Figure 1")
+    assert figure.bbox[1] >= 115 and figure.bbox[3] <= 330
+    assert os.path.exists(figure.image_path)
+
+    pixmap = pymupdf.Pixmap(figure.image_path)
+    assert max(pixmap.width, pixmap.height) <= 200
+
+
+def test_in_text_reference_is_not_a_caption(tmp_path):
+    """Test that a paragraph starting "Figure 1 shows" before the figure does not replace its caption"""
+    pdf_path = str(tmp_path / "reference_first.pdf")
+    doc = pymupdf.open()
+    page = doc.new_page()
+    page.insert_textbox(pymupdf.Rect(72, 72, 520, 300),
+                        "Figure 1 shows the overall pipeline of our method, from raw widgets to deep "
+                        "gadgets. Each stage is trained separately and then fine-tuned end to end.", fontsize=10)
+    page = doc.new_page()
+    page.draw_rect(pymupdf.Rect(100, 120, 400, 320), color=(0, 0, 1), fill=(0.8, 0.8, 1))
+    page.insert_text((100, 340), "Figure 1: The overall pipeline.")
+    doc.save(pdf_path)
+    doc.close()
+
+    figures = FigureExtractor(pdf_path, str(tmp_path / "out")).extract()
+
+    assert figures[1].page == 1
+    assert figures[1].caption == "Figure 1: The overall pipeline."
+    assert figures[1].bbox[1] >= 115 and figures[1].bbox[3] <= 330
+
+
+def test_extract_uses_cache(figure_pdf, tmp_path):
+    """Test that crops are reused on a second run with identical settings"""
+    output_dir = str(tmp_path / "out")
+    first = FigureExtractor(figure_pdf, output_dir).extract()
+    mtime = os.path.getmtime(first[1].image_path)
+
+    second = FigureExtractor(figure_pdf, output_dir).extract()
+    assert second == first
+    assert os.path.getmtime(second[1].image_path) == mtime
+
+
+def test_supports_vision():
+    """Test vision model matching including prefix patterns"""
+    assert supports_vision("gpt-4o")
+    assert supports_vision("gemini-1.5-pro")
+    assert not supports_vision("gpt-4o-mini")
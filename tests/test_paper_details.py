@@ -0,0 +1,111 @@
+import pymupdf
+from paper_details import extract_local_details
+
+ABSTRACT = ("We present deep widgets, a family of gadgets that learn their own depth. "
+            "Across twelve benchmarks deep widgets outperform shallow baselines while using "
+            "fewer parameters, and we release code and models to the community.")
+
+
+def make_pdf(path, lines, metadata=None):
+    """Write a one-page PDF with (text, font size) lines"""
+    doc = pymupdf.open()
+    page = doc.new_page()
+    y = 72
+    for text, size in lines:
+        page.insert_text((72, y), text, fontsize=size)
+        y += size * 2
+    if metadata:
+        doc.set_metadata(metadata)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_extracts_confident_details(tmp_path):
+    """Test title, authors and abstract recovery from the first-page layout"""
+    abstract_lines = [ABSTRACT[i:i + 80] for i in range(0, len(ABSTRACT), 80)]
+    pdf_path = make_pdf(str(tmp_path / "paper.pdf"), [
+        ("Deep Widgets Learn", 18), ("Their Own Depth", 18),
+        ("Ada Lovelace1*, Alan Turing2", 11),
+        ("1 University of Widgets, ada@widgets.org", 9),
+        ("Abstract", 11),
+        *[(line, 10) for line in abstract_lines],
+        ("1 Introduction", 11),
+        ("Widgets have a long history in the field of gadgets.", 10),
+    ], metadata={"title": "Deep Widgets Learn Their Own Depth"})
+
+    details, confidence = extract_local_details(pdf_path)
+
+    assert details["title"] == "Deep Widgets Learn Their Own Depth"
+    assert details["authors"] == "Ada Lovelace, Alan Turing"
+    assert details["abstract"].startswith("We present deep widgets")
+    assert "long history" not in details["abstract"]
+    assert confidence >= 0.8
+
+
+def test_low_confidence_without_abstract(tmp_path):
+    """Test that missing layout cues lead to a low confidence score"""
+    pdf_path = make_pdf(str(tmp_path / "notes.pdf"), [("some notes", 10), ("more notes", 10)],
+                        metadata={"title": "Microsoft Word - notes.docx"})
+
+    details, confidence = extract_local_details(pdf_path)
+
+    assert details["abstract"] == ""
+    assert confidence < 0.5
+
+
+def test_identifier_under_title_is_not_an_author(tmp_path, monkeypatch):
+    """Test that an arXiv identifier or date under the title is not scored as authors, so the LLM is asked"""
+    import paper_analyzer
+    from langchain_core.documents import Document
+    from events import EventBus, LOCAL_DETAILS
+    from schemas import FiguresCount, PaperDetails
+
+    abstract_lines = [ABSTRACT[i:i + 80] for i in range(0, len(ABSTRACT), 80)]
+    pdf_path = make_pdf(str(tmp_path / "paper.pdf"), [
+        ("Deep Widgets Learn Their Own Depth", 18),
+        ("arXiv:2401.01234v2 [cs.LG] 12 Jan 2024", 10),
+        ("Abstract", 11),
+        *[(line, 10) for line in abstract_lines],
+        ("1 Introduction", 11),
+    ])
+
+    details, confidence = extract_local_details(pdf_path)
+    assert details["authors"] == ""
+    assert confidence < 0.8
+
+    asked = []
+
+    def fake_query_document(document, prompt_template=None, pydantic_model=None, **kwargs):
+        asked.append(pydantic_model)
+        if pydantic_model is FiguresCount:
+            return FiguresCount(total_figures=0)
+        return PaperDetails(title="Deep Widgets Learn Their Own Depth", authors="Ada Lovelace", abstract=ABSTRACT)
+
+    monkeypatch.setattr(paper_analyzer, "query_document", fake_query_document)
+    events = EventBus()
+    received = []
+    events.subscribe(received.append)
+    analyzer = paper_analyzer.PaperAnalyzer(pdf_path, api_key="key", model_name="gpt-4o", provider="openai",
+                                            output_dir=str(tmp_path / "output"), events=events)
+    analyzer.document = [Document(page_content="Deep Widgets Learn Their Own Depth", metadata={"page": 0})]
+    analyzer.extract_basic_info()
+
+    assert asked == [FiguresCount, PaperDetails]
+    assert analyzer.details_response.authors == "Ada Lovelace"
+    assert [e.data["used"] for e in received if e.type == LOCAL_DETAILS] == [False]
+
+
+def test_names_and_metadata_authors(tmp_path):
+    """Test that author lines are kept when they read as names or match the metadata authors"""
+    from paper_details import _looks_like_names
+
+    assert _looks_like_names("Ada Lovelace, Alan Turing and J.-P. van der Berg")
+    assert not _looks_like_names("arXiv:2401.01234v2 [cs.LG] 12 Jan 2024")
+    assert not _looks_like_names("Published as a conference paper at ICLR 2024")
+
+    pdf_path = make_pdf(str(tmp_path / "paper.pdf"), [
+        ("Deep Widgets Learn Their Own Depth", 18), ("ADA LOVELACE", 11), ("Abstract", 11), (ABSTRACT[:80], 10)
+    ], metadata={"author": "Ada Lovelace"})
+    details, _ = extract_local_details(pdf_path)
+    assert details["authors"] == "ADA LOVELACE"
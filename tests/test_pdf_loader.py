@@ -0,0 +1,58 @@
+import pymupdf
+import pytest
+from pdf_loader import extract_pages, load_pdf_documents
+
+
+@pytest.fixture
+def multi_page_pdf(tmp_path):
+    """Create a PDF whose pages each name their own number"""
+    pdf_path = str(tmp_path / "pages.pdf")
+    doc = pymupdf.open()
+    for i in range(9):
+        doc.new_page().insert_text((72, 72), f"This is page {i}")
+    doc.save(pdf_path)
+    doc.close()
+    return pdf_path
+
+
+def test_parallel_matches_serial(multi_page_pdf):
+    """Test that page-parallel extraction returns the same pages in order"""
+    serial = extract_pages(multi_page_pdf, workers=1)
+    parallel = extract_pages(multi_page_pdf, workers=3)
+
+    assert parallel == serial
+    assert [text.strip() for text in parallel] == [f"This is page {i}" for i in range(9)]
+
+
+def test_documents_match_loader(multi_page_pdf):
+    """Test that parallel loading gives exactly the PyMuPDFLoader documents: page text and metadata"""
+    from langchain_community.document_loaders import PyMuPDFLoader
+
+    with pymupdf.open(multi_page_pdf) as doc:
+        doc.set_metadata({"title": "Pages", "author": "Ada Lovelace", "creationDate": "D:20240101000000Z"})
+        doc.saveIncr()
+
+    documents = load_pdf_documents(multi_page_pdf, workers=2)
+    expected = PyMuPDFLoader(multi_page_pdf).load()
+
+    assert [d.page_content for d in documents] == [d.page_content for d in expected]
+    assert [d.metadata for d in documents] == [d.metadata for d in expected]
+    assert documents[4].metadata["page"] == 4
+
+
+def test_blank_first_page_matches_loader(tmp_path):
+    """Test that a blank first page does not decide whether page text is stripped"""
+    from langchain_community.document_loaders import PyMuPDFLoader
+
+    pdf_path = str(tmp_path / "blank.pdf")
+    doc = pymupdf.open()
+    doc.new_page()
+    for i in range(1, 3):
+        doc.new_page().insert_text((72, 72), f"This is page {i}")
+    doc.save(pdf_path)
+    doc.close()
+
+    documents = load_pdf_documents(pdf_path, workers=1)
+    expected = PyMuPDFLoader(pdf_path).load()
+
+    assert [d.page_content for d in documents] == [d.page_content for d in expected]
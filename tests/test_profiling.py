@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+
+import pytest
+
+import profiling
+from profiling import Profiler, section, profiled, propagate
+
+
+def test_sections_are_free_when_inactive():
+    """Test that sections outside a profiled run share one no-op context manager"""
+    assert section("a") is section("b")
+    with section("a"):
+        pass
+
+
+def test_breakdown_nests_per_thread():
+    """Test self/total times for nested sections, including sections in threads the run starts"""
+    @profiled("work")
+    def work():
+        with section("wait"):
+            time.sleep(0.02)
+
+    profiler = Profiler()
+    profiler.start()
+    try:
+        with section("stage"):
+            threads = [threading.Thread(target=propagate(work)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        profiler.stop()
+
+    rows = {row[0]: row for row in profiler.breakdown()}
+    assert profiling._active.get() is None
+    assert rows["work"][1] == 2 and rows["wait"][1] == 2
+    assert rows["wait"][2] >= 0.04
+    assert rows["work"][3] < rows["work"][2]  # the sleep is attributed to "wait"
+    assert rows["stage"][3] >= 0.02  # joining threads is the stage's own time
+    assert "stage" in profiler.table()
+
+
+def test_speedscope_profile_is_balanced(tmp_path):
+    """Test the speedscope output: one evented profile per thread, every frame opened and closed"""
+    profiler = Profiler(cprofile=True, memory=True)
+    profiler.start()
+    with section("outer"):
+        with section("inner"):
+            sum(range(1000))
+    open_section = section("left open")
+    open_section.__enter__()
+    profiler.stop()
+
+    paths = profiler.write(str(tmp_path), name="paper")
+    data = json.loads((tmp_path / "profile.speedscope.json").read_text())
+
+    assert [f["name"] for f in data["shared"]["frames"]] == ["outer", "inner", "left open"]
+    events = data["profiles"][0]["events"]
+    assert [e["type"] for e in events] == ["O", "O", "C", "C", "O", "C"]
+    assert all(a["at"] <= b["at"] for a, b in zip(events, events[1:]))
+    assert (tmp_path / "profile.pstats").exists() and len(paths) == 3
+    report = (tmp_path / "profile.txt").read_text()
+    assert "cProfile" in report and "Peak traced memory" in report
+
+
+def test_concurrent_runs_are_profiled_separately():
+    """Test that two runs profiled at once each record only their own sections"""
+    profilers = {}
+    barrier = threading.Barrier(2)
+
+    def run(name):
+        profiler = profilers[name] = Profiler()
+        profiler.start()
+        barrier.wait()
+        with section(name):
+            time.sleep(0.01)
+        if name == "first":
+            profiler.stop()
+        barrier.wait()
+        # The first run has stopped; the second is still profiling
+        with section(f"{name} later"):
+            pass
+        if name == "second":
+            profiler.stop()
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {row[0] for row in profilers["first"].breakdown()} == {"first"}
+    assert {row[0] for row in profilers["second"].breakdown()} == {"second", "second later"}
+
+
+def test_failed_profile_write_keeps_analysis_error(tmp_path, monkeypatch):
+    """Test that a profile that cannot be written neither hides the run's error nor replaces it"""
+    from paper_analyzer import PaperAnalyzer
+
+    def fail_write(*args, **kwargs):
+        raise OSError("disk full")
+
+    profiler = Profiler()
+    monkeypatch.setattr(profiler, "write", fail_write)
+    analyzer = PaperAnalyzer(str(tmp_path / "missing.pdf"), api_key="k", model_name="gpt-4o",
+                             provider="openai", output_dir=str(tmp_path), profiler=profiler)
+    messages = []
+    analyzer.events.subscribe(lambda event: messages.append(event.data.get("message", "")))
+
+    with pytest.raises(Exception) as error:
+        analyzer.analyze()
+    assert "disk full" not in str(error.value)
+    assert any("Could not write profile: disk full" in message for message in messages)
@@ -0,0 +1,58 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import utils
+from events import EventBus, CACHE_HIT
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Replace the model client with one that records the prompts it receives"""
+    received = []
+    fake_llm = RunnableLambda(lambda prompt: received.append(prompt.to_string()) or AIMessage(content="ok"))
+    monkeypatch.setattr(utils, "get_chat_model", lambda *args: fake_llm)
+    utils._chain.cache_clear()
+    yield received
+    utils._chain.cache_clear()
+
+
+def test_chains_are_compiled_once_per_template_and_client(prompts):
+    """Test that repeated calls reuse one chain, while other templates and limits get their own"""
+    events = EventBus()
+    received = []
+    events.subscribe(received.append)
+    for figure_number in (1, 2, 3):
+        utils.query_document("paper", "Figure {figure_number}: {text}", api_key="key", events=events,
+                             figure_number=figure_number)
+    utils.query_document("paper", "Summarize: {text}", api_key="key", events=events)
+    utils.query_document("paper", "Summarize: {text}", api_key="key", events=events, max_tokens=256)
+
+    info = utils._chain.cache_info()
+    assert (info.misses, info.hits) == (3, 2)
+    assert [e.data["cache"] for e in received if e.type == CACHE_HIT] == ["chain", "chain"]
+    assert prompts[:2] == ["Figure 1: paper", "Figure 2: paper"]
+
+
+def test_documents_are_rendered_once(prompts, monkeypatch):
+    """Test that a loaded paper is rendered once, as str() renders it but without its file path"""
+    renders = []
+    prompt_text = utils._prompt_text
+    monkeypatch.setattr(utils, "_prompt_text", lambda document: renders.append(document) or prompt_text(document))
+    document = [Document(page_content="Page one", metadata={"source": "/tmp/tmpab12.pdf",
+                                                            "file_path": "/tmp/tmpab12.pdf", "page": 0})]
+    expected = str([Document(page_content="Page one", metadata={"page": 0})])
+
+    events = EventBus()
+    received = []
+    events.subscribe(received.append)
+    for figure_number in (1, 2):
+        utils.query_document(document, "Figure {figure_number}: {text}", api_key="key", events=events,
+                             figure_number=figure_number)
+    utils.query_document(document, "{answer} {text}", api_key="key", events=events, answer="A", text=document)
+
+    assert len(renders) == 1
+    assert [e.data["cache"] for e in received if e.type == CACHE_HIT].count("render") == 2
+    assert prompts == [f"Figure 1: {expected}", f"Figure 2: {expected}", f"A {expected}"]
+    assert "tmpab12" not in prompts[0]
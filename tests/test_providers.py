@@ -128,3 +128,21 @@ def test_cross_provider_comparison(api_keys, test_pdf):
         assert response is not None
         assert isinstance(response, str)
         assert len(response) > 0
+
+def test_parallel_provider_comparison(api_keys, test_pdf):
+    """Compare responses across providers with a single concurrent fan-out"""
+    test_query = "What is the main topic of this paper?"
+    analyzer = PaperAnalyzer(
+        test_pdf,
+        api_key=api_keys["openai"],
+        model_name=MODEL_CONFIGS["openai"]["models"][0],
+        provider="openai",
+        output_dir=TEST_OUTPUT_DIR
+    )
+    results = analyzer.compare_providers(test_query, ["openai", "openrouter", "gemini"], api_keys=api_keys)
+
+    for provider, result in results.items():
+        assert result["error"] is None, f"{provider} failed: {result['error']}"
+        assert isinstance(result["answer"], str)
+        assert len(result["answer"]) > 0
+        assert result["elapsed"] > 0
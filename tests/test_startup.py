@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_openai", "langchain_community", "pydantic", "pymupdf", "dotenv"]
+
+
+def test_entry_point_imports_are_lazy():
+    """Test that importing the CLI module does not load LangChain or other heavy dependencies"""
+    code = (
+        "import sys, paper_analyzer\n"
+        f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(','.join(loaded))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_schemas_still_exported():
+    """Test that the pydantic models remain importable from paper_analyzer"""
+    from paper_analyzer import PaperDetails, FiguresCount
+    assert "title" in PaperDetails.model_fields
+    assert "total_figures" in FiguresCount.model_fields
@@ -0,0 +1,128 @@
+import time
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable, RunnableLambda
+
+import utils
+from schemas import FiguresCount
+from transcript import TranscriptRecorder, ReplayChatModel, read_transcript
+from events import EventBus, LLM_CALL
+
+
+class FakeChatModel(Runnable):
+    """Stands in for a provider client: echoes the prompt and reports token usage"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        usage = {"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}
+        return AIMessage(content=f"answer {self.calls}", usage_metadata=usage)
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        usage = {"input_tokens": 8, "output_tokens": 2, "total_tokens": 10}
+
+        def structured(prompt):
+            parsed = schema(total_figures=3)
+            if not include_raw:
+                return parsed
+            return {"raw": AIMessage(content="", usage_metadata=usage), "parsed": parsed, "parsing_error": None}
+        return RunnableLambda(structured)
+
+
+@pytest.fixture(autouse=True)
+def fresh_chains():
+    """Compiled chains hold the client they were built with, so rebuild them for each patched client"""
+    utils._chain.cache_clear()
+    yield
+    utils._chain.cache_clear()
+
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    """Record a structured and a plain query, returning the transcript path and the live answers"""
+    path = str(tmp_path / "transcript.jsonl.gz")
+    recorder = TranscriptRecorder(path)
+    monkeypatch.setattr(utils, "get_chat_model", lambda *args: FakeChatModel(delay=0.05))
+
+    count = utils.query_document("Figure 1: a plot", "{text}", api_key="key",
+                                 pydantic_model=FiguresCount, transcript=recorder)
+    answer = utils.query_document("paper text", "Explain figure {figure_number}: {text}", api_key="key",
+                                  transcript=recorder, figure_number=1)
+    return path, count, answer
+
+
+def test_recorder_writes_compact_entries(recorded):
+    """Test that each call is recorded with its response and timing"""
+    path, _, _ = recorded
+    entries = read_transcript(path)
+
+    assert [e["schema"] for e in entries] == ["FiguresCount", None]
+    assert entries[0]["data"] == {"total_figures": 3}
+    assert entries[0]["usage"]["total_tokens"] == 10
+    assert entries[1]["content"] == "answer 1"
+    assert entries[1]["usage"]["total_tokens"] == 15
+    assert entries[1]["latency"] >= 0.05
+    assert entries[0]["key"] != entries[1]["key"]
+
+
+def test_replay_serves_recorded_responses(recorded, monkeypatch):
+    """Test that the replay provider answers offline with the recorded outputs and usage"""
+    path, count, answer = recorded
+    monkeypatch.setattr(utils, "get_chat_model", lambda provider, model_name, *args: ReplayChatModel(path, model_name))
+    utils._chain.cache_clear()
+    events = EventBus()
+    calls = []
+    events.subscribe(lambda event: calls.append(event) if event.type == LLM_CALL else None)
+
+    replayed_count = utils.query_document("Figure 1: a plot", "{text}", provider="replay",
+                                          pydantic_model=FiguresCount, events=events)
+    replayed = utils.query_document("paper text", "Explain figure {figure_number}: {text}", provider="replay",
+                                    events=events, figure_number=1)
+
+    assert replayed_count == count
+    assert replayed.content == answer.content
+    assert [call.data["tokens"] for call in calls] == [10, 15]
+
+
+def test_replay_miss_and_latency(recorded):
+    """Test that unrecorded requests fail clearly and recorded latencies can be replayed"""
+    path, _, _ = recorded
+    model = ReplayChatModel(path, "gpt-4o")
+    with pytest.raises(LookupError):
+        model.invoke("a prompt that was never recorded")
+
+    slow = ReplayChatModel(path, "gpt-4o", latency_scale=1.0)
+    start = time.perf_counter()
+    slow.invoke("Explain figure 1: paper text")
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_replay_ignores_where_the_pdf_was(tmp_path, monkeypatch):
+    """Test that a paper recorded from one path replays from another, under the analyzer's output directory"""
+    from langchain_core.documents import Document
+    from paper_analyzer import PaperAnalyzer
+
+    def paper(path):
+        return [Document(page_content="Deep widgets.", metadata={"source": path, "file_path": path, "page": 0})]
+
+    output_dir = str(tmp_path / "runs")
+    monkeypatch.setattr(utils, "get_chat_model", lambda *args: FakeChatModel())
+    recording = PaperAnalyzer(str(tmp_path / "widgets.pdf"), api_key="key", provider="openai",
+                              model_name="gpt-4o", output_dir=output_dir, record=True)
+    recording.document = paper(str(tmp_path / "widgets.pdf"))
+    answer = recording.custom_query("What is new?")
+
+    monkeypatch.undo()
+    utils._chain.cache_clear()
+    replaying = PaperAnalyzer(str(tmp_path / "upload-1234.pdf"), api_key=None, provider="replay",
+                              model_name="gpt-4o", output_dir=output_dir)
+    replaying.document = paper(str(tmp_path / "upload-1234.pdf"))
+    assert replaying.custom_query("What is new?") == answer
+
+    with pytest.raises(ValueError):
+        PaperAnalyzer(str(tmp_path / "widgets.pdf"), api_key=None, provider="replay", model_name="gpt-4o",
+                      output_dir=output_dir, record=True)
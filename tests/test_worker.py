@@ -0,0 +1,76 @@
+import threading
+import pytest
+from worker import JobQueue, Worker, QUEUED, RUNNING, FAILED
+
+
+@pytest.fixture
+def queue(tmp_path):
+    """Create a job queue in a temporary database"""
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_submit_and_claim(queue, tmp_path):
+    """Test that jobs are claimed once, oldest first"""
+    first = queue.submit("a.pdf", output_dir=str(tmp_path))
+    second = queue.submit("b.pdf", output_dir=str(tmp_path))
+
+    assert queue.get(first)["status"] == QUEUED
+    assert queue.claim()["id"] == first
+    assert queue.claim()["id"] == second
+    assert queue.claim() is None
+    assert queue.get(first)["status"] == RUNNING
+
+
+def test_update_and_requeue(queue, tmp_path):
+    """Test progress updates and requeueing of jobs whose worker stopped sending heartbeats"""
+    job_id = queue.submit("a.pdf", output_dir=str(tmp_path))
+    assert queue.claim("worker-1")["worker_id"] == "worker-1"
+    queue.update(job_id, stage="Loading document", progress=0.2)
+
+    job = queue.get(job_id)
+    assert job["stage"] == "Loading document"
+    assert job["progress"] == 0.2
+
+    # A second worker starting up leaves the first worker's live job alone
+    queue.heartbeat("worker-1")
+    assert queue.requeue_stale(stale_after=60) == 0
+    assert queue.get(job_id)["status"] == RUNNING
+
+    assert queue.requeue_stale(stale_after=-1) == 1
+    job = queue.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["worker_id"] is None
+
+    with pytest.raises(ValueError):
+        queue.update(job_id, unknown_field=1)
+
+
+def test_worker_records_failure(queue, tmp_path):
+    """Test that a worker marks jobs with an unreadable PDF as failed"""
+    job_id = queue.submit(str(tmp_path / "missing.pdf"), output_dir=str(tmp_path / "output"))
+    worker = Worker(queue, concurrency=1, poll_interval=0.05, api_keys={})
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    try:
+        job = queue.wait(job_id, poll_interval=0.05)
+    finally:
+        worker.stop()
+        thread.join(timeout=5)
+
+    assert job["status"] == FAILED
+    assert job["error"]
+
+
+def test_lost_job_is_not_touched(queue, tmp_path):
+    """Test that a worker whose job was requeued and reclaimed can no longer update it"""
+    job_id = queue.submit("a.pdf", output_dir=str(tmp_path))
+    queue.claim("worker-1")
+    queue.requeue_stale(stale_after=-1)
+    queue.claim("worker-2")
+
+    assert not queue.update(job_id, owner="worker-1", status=FAILED, error="late")
+    assert queue.update(job_id, owner="worker-2", progress=0.5)
+    job = queue.get(job_id)
+    assert job["status"] == RUNNING
+    assert job["worker_id"] == "worker-2"
+    assert job["progress"] == 0.5
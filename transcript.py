@@ -0,0 +1,166 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from config import TRANSCRIPT_FILE, REPLAY_LATENCY_SCALE
+
+
+def _messages(prompt) -> list:
+    """Return the chat messages a model receives for a prompt value, string or message list."""
+    if isinstance(prompt, PromptValue):
+        return prompt.to_messages()
+    if isinstance(prompt, str):
+        return [HumanMessage(content=prompt)]
+    return list(prompt)
+
+
+def transcript_key(prompt, schema=None) -> str:
+    """
+    Hash a request by its messages and structured-output schema.
+
+    The paper's text is part of the prompt, so keys identify a request across runs. Loaded papers
+    are rendered without their file paths (see utils.render_document), so a renamed, copied or
+    uploaded copy of a PDF replays too; a request differing in any other way misses.
+    """
+    payload = json.dumps([[m.type, m.content] for m in _messages(prompt)] + [schema.__name__ if schema else None],
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class TranscriptRecorder:
+    """
+    Record every model request and response of a run to a gzipped JSON-lines transcript.
+
+    Each line holds the request key, model, schema, response (message content or the structured
+    output's fields, with token usage; or the error) and its start offset and latency.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        # Start a fresh transcript; entries are appended as gzip members as they complete
+        with gzip.open(path, 'wt', encoding='utf-8'):
+            pass
+
+    def wrap(self, llm, model_name: str, schema=None):
+        """Return a runnable that invokes `llm` and records the call."""
+        def record(prompt):
+            entry = {"key": transcript_key(prompt, schema), "model": model_name,
+                     "schema": schema.__name__ if schema else None}
+            start = time.perf_counter()
+            try:
+                response = llm.invoke(prompt)
+            except Exception as e:
+                entry["error"] = str(e)
+                raise
+            else:
+                if schema is not None:
+                    # Structured output is requested with include_raw, so the raw message is kept too
+                    if response["parsing_error"] is not None:
+                        entry["error"] = str(response["parsing_error"])
+                    else:
+                        entry["data"] = response["parsed"].model_dump()
+                    message = response["raw"]
+                else:
+                    entry["content"] = response.content
+                    message = response
+                entry["usage"] = getattr(message, "usage_metadata", None)
+                return response
+            finally:
+                entry["start"] = round(start - self._started, 4)
+                entry["latency"] = round(time.perf_counter() - start, 4)
+                self._write(entry)
+
+        return RunnableLambda(record)
+
+    def _write(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+def read_transcript(path: str) -> list:
+    """Return the entries of a transcript file in the order they were recorded."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayChatModel(Runnable):
+    """
+    Chat model that answers from recorded transcripts instead of a provider.
+
+    `source` is a transcript file or a directory searched recursively for transcripts.
+    Repeated requests are answered with their recordings in order. Recordings made with
+    `model_name` are preferred; otherwise any recording of the request is used. With a
+    `latency_scale` above 0, each answer is delayed by its recorded latency times the scale.
+    """
+
+    def __init__(self, source: str, model_name: str, latency_scale: float = REPLAY_LATENCY_SCALE):
+        self.source = source
+        self.model_name = model_name
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._files = None
+        self._entries = {}
+        self._served = {}
+
+    def _transcript_files(self) -> dict:
+        if os.path.isfile(self.source):
+            paths = [self.source]
+        else:
+            paths = glob.glob(os.path.join(self.source, "**", TRANSCRIPT_FILE), recursive=True)
+        return {path: os.path.getmtime(path) for path in paths}
+
+    def _load(self) -> None:
+        files = self._transcript_files()
+        entries = {}
+        # Oldest transcripts first, so repeated requests replay in recording order
+        for path in sorted(files, key=files.get):
+            for entry in read_transcript(path):
+                entries.setdefault(entry["key"], []).append(entry)
+        self._files, self._entries, self._served = files, entries, {}
+
+    def _next_entry(self, key: str) -> dict:
+        with self._lock:
+            if self._files is None or (key not in self._entries and self._transcript_files() != self._files):
+                self._load()
+            entries = self._entries.get(key)
+            if not entries:
+                raise LookupError(f"No recorded response for this {self.model_name} request in {self.source}; "
+                                  "record one with --record")
+            preferred = [e for e in entries if e["model"] == self.model_name] or entries
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            # Once every recording has been served, keep answering with the last one
+            return preferred[min(served, len(preferred) - 1)]
+
+    def _replay(self, prompt, schema=None, include_raw=False):
+        entry = self._next_entry(transcript_key(prompt, schema))
+        if self.latency_scale > 0:
+            time.sleep(entry["latency"] * self.latency_scale)
+        if "error" in entry:
+            raise RuntimeError(entry["error"])
+        if schema is None:
+            return AIMessage(content=entry["content"], usage_metadata=entry.get("usage"))
+        parsed = schema(**entry["data"])
+        if not include_raw:
+            return parsed
+        # Matches with_structured_output(include_raw=True): the message only carries the usage
+        return {"raw": AIMessage(content="", usage_metadata=entry.get("usage")), "parsed": parsed,
+                "parsing_error": None}
+
+    def invoke(self, input, config=None, **kwargs):
+        return self._replay(input)
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        return RunnableLambda(lambda prompt: self._replay(prompt, schema, include_raw))
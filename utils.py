@@ -1,61 +1,228 @@
-from langchain.prompts import PromptTemplate
-from templates import EXPAND_ANSWER_TEMPLATE, FIGURE_CONNECTION_TEMPLATE, FIGURE_INFO_TEMPLATE
-from config import DEFAULT_MODEL, DEFAULT_PROVIDER, MODEL_CONFIGS
-from models import create_model_config
+import base64
+import threading
+import time
+from functools import lru_cache
+from templates import EXPAND_ANSWER_TEMPLATE, FIGURE_CONNECTION_TEMPLATE, FIGURE_INFO_TEMPLATE, FIGURE_VISION_TEMPLATE
+from config import (DEFAULT_MODEL, DEFAULT_PROVIDER, MODEL_CONFIGS, HEDGE_AFTER_SECONDS, REQUEST_TIMEOUT,
+                    REPLAY_PROVIDER, CHAIN_CACHE_SIZE, RENDER_CACHE_SIZE)
+from models import get_chat_model, supports_vision
+from events import emit, LLM_CALL, FIGURE_COMPLETED, EXPANSION_COMPLETED, HEDGE, LOG, CACHE_HIT
+from profiling import section, profiled, propagate
 from concurrent.futures import ThreadPoolExecutor
 import concurrent.futures
 
 
-def query_document(document, prompt_template=None, model_name=DEFAULT_MODEL, provider=DEFAULT_PROVIDER, 
-                  api_key=None, pydantic_model=None, **prompt_variables):
-    """Query the document using the specified model and provider."""
+def _response_tokens(response):
+    """Return the total tokens reported for a chat response, or None when the provider reports no usage."""
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def skipped_response(reason: str):
+    """Stand-in for an answer that was not generated, so writers can treat it like any response."""
+    from langchain_core.messages import AIMessage
+
+    return AIMessage(content=f"[Not generated: {reason}]")
+
+
+def _chat_model(provider, model_name, api_key, max_tokens, timeout, replay_dir=None):
+    """
+    Return the shared client for this provider/model and limits. Replays need no API key and
+    answer from the transcripts under `replay_dir` (REPLAY_DIR by default).
+    """
+    if provider == REPLAY_PROVIDER:
+        return get_chat_model(provider, model_name, api_key, replay_dir, max_tokens, timeout)
     if api_key is None:
         raise ValueError("API key must be provided")
+    api_base = MODEL_CONFIGS.get(provider, {}).get("api_base")
+    return get_chat_model(provider, model_name, api_key, api_base, max_tokens, timeout)
 
-    # Create model configuration
-    api_base = MODEL_CONFIGS[provider]["api_base"]
-    model_config = create_model_config(provider, model_name, api_key, api_base)
-    
-    # Create LLM instance
-    llm = model_config.create_chat_model()
+
+# Set by _chain in the calling thread when it compiles a chain, telling lru_cache misses from hits
+_compiled = threading.local()
+
+
+@lru_cache(maxsize=CHAIN_CACHE_SIZE)
+def _chain(prompt_template, input_variables, provider, model_name, api_key, max_tokens, timeout,
+           pydantic_model, transcript, replay_dir):
+    """Return the `prompt | llm` chain for a template and model client, compiling it on first use."""
+    from langchain.prompts import PromptTemplate
+
+    _compiled.chain = True
+    llm = _chat_model(provider, model_name, api_key, max_tokens, timeout, replay_dir)
     if pydantic_model:
-        llm = llm.with_structured_output(pydantic_model)
+        # Keep the raw message alongside the parsed output, for its token usage
+        llm = llm.with_structured_output(pydantic_model, include_raw=True)
+    if transcript is not None:
+        llm = transcript.wrap(llm, model_name, pydantic_model)
+    prompt = PromptTemplate(template=prompt_template, input_variables=list(input_variables))
+    return prompt | llm
+
+
+# id(document) -> (document, rendered text). Holding the document keeps its id from being reused.
+_rendered = {}
+_rendered_lock = threading.Lock()
+
+# Document metadata naming the file a paper was loaded from, which prompts leave out
+PATH_METADATA_KEYS = ("source", "file_path")
 
-    # Create prompt template
-    prompt = PromptTemplate(template=prompt_template,
-                          input_variables=list(prompt_variables.keys()))
-    chain = prompt | llm
+
+def _prompt_text(document) -> str:
+    """Convert a loaded paper to prompt text, as str() does, without its file path metadata."""
+    if isinstance(document, list) and all(hasattr(page, "metadata") for page in document):
+        document = [page.model_copy(update={"metadata": {k: v for k, v in page.metadata.items()
+                                                         if k not in PATH_METADATA_KEYS}})
+                    for page in document]
+    return str(document)
+
+
+def render_document(document, events=None) -> str:
+    """
+    Return the document as it appears in a prompt, rendering each document once.
+
+    Loaded papers are lists of LangChain Documents, which the prompt would otherwise convert
+    to text on every call; the rendered string is shared by all calls for that document.
+    Their file paths are left out, so the same paper gives the same prompts (and transcript
+    keys) wherever its PDF is. Documents must not be modified after they are first queried.
+    Reusing a rendering emits a cache_hit event on `events`.
+    """
+    if isinstance(document, str):
+        return document
+    with _rendered_lock:
+        cached = _rendered.get(id(document))
+    if cached is not None and cached[0] is document:
+        emit(events, CACHE_HIT, cache="render")
+        return cached[1]
+    text = _prompt_text(document)
+    with _rendered_lock:
+        if len(_rendered) >= RENDER_CACHE_SIZE:
+            _rendered.pop(next(iter(_rendered)))
+        _rendered[id(document)] = (document, text)
+    return text
+
+
+@profiled("query_document")
+def query_document(document, prompt_template=None, model_name=DEFAULT_MODEL, provider=DEFAULT_PROVIDER, 
+                  api_key=None, pydantic_model=None, events=None, max_tokens=None, timeout=REQUEST_TIMEOUT,
+                  transcript=None, replay_dir=None, **prompt_variables):
+    """
+    Query the document using the specified model and provider, emitting an llm_call event on `events`.
+    `max_tokens` caps the generated tokens and `timeout` bounds the request, in seconds. The request
+    and response are recorded on `transcript`, a TranscriptRecorder, when given. The replay provider
+    answers from the transcripts under `replay_dir`.
+    """
+    # Reuse the compiled chain for this template and provider/model and limits
+    with section("get_chain"):
+        _compiled.chain = False
+        chain = _chain(prompt_template, tuple(prompt_variables), provider, model_name, api_key,
+                       max_tokens, timeout, pydantic_model, transcript, replay_dir)
+    if not _compiled.chain:
+        emit(events, CACHE_HIT, cache="chain")
+
+    with section("render_text"):
+        variables = {"text": document, **prompt_variables}
+        variables["text"] = render_document(variables["text"], events=events)
 
     # Run the chain
-    response = chain.invoke({
-        "text": document,
-        **prompt_variables
-    })
+    start = time.perf_counter()
+    with section("llm_request"):
+        response = chain.invoke(variables)
+    raw, parsing_error = response, None
+    if pydantic_model is not None:
+        raw, parsing_error, response = response["raw"], response["parsing_error"], response["parsed"]
+    emit(events, LLM_CALL, provider=provider, model_name=model_name, duration=time.perf_counter() - start,
+         structured=pydantic_model is not None, tokens=_response_tokens(raw))
+    if parsing_error is not None:
+        raise parsing_error
 
     return response
 
 
+@profiled("query_figure_image")
+def query_figure_image(figure, model_name=DEFAULT_MODEL, provider=DEFAULT_PROVIDER, api_key=None, events=None,
+                       max_tokens=None, timeout=REQUEST_TIMEOUT, transcript=None, replay_dir=None):
+    """Ask a vision-capable model about a rendered figure crop and its caption."""
+    from langchain_core.messages import HumanMessage
+
+    with section("get_client"):
+        llm = _chat_model(provider, model_name, api_key, max_tokens, timeout, replay_dir)
+        if transcript is not None:
+            llm = transcript.wrap(llm, model_name)
+
+    with section("encode_image"):
+        with open(figure.image_path, 'rb') as f:
+            image_data = base64.b64encode(f.read()).decode("ascii")
+
+    message = HumanMessage(content=[
+        {"type": "text",
+         "text": FIGURE_VISION_TEMPLATE.format(figure_number=figure.number, caption=figure.caption)},
+        {"type": "image_url",
+         "image_url": {"url": f"data:image/png;base64,{image_data}"}}
+    ])
+    start = time.perf_counter()
+    with section("llm_request"):
+        response = llm.invoke([message])
+    emit(events, LLM_CALL, provider=provider, model_name=model_name, duration=time.perf_counter() - start,
+         structured=False, tokens=_response_tokens(response), figure_number=figure.number)
+    return response
+
+
 def process_figure_answers(document, total_figures: int, model_name: str = DEFAULT_MODEL, 
-                         provider: str = DEFAULT_PROVIDER, api_key: str = None) -> dict:
-    """Process and gather information and connections for each figure in parallel"""
+                         provider: str = DEFAULT_PROVIDER, api_key: str = None, figures: dict = None,
+                         events=None, info_max_tokens: int = None, connection_max_tokens: int = None,
+                         budget=None, transcript=None, replay_dir=None) -> dict:
+    """
+    Process and gather information and connections for each figure in parallel.
+
+    When `figures` maps figure numbers to rendered crops and the model supports
+    images, the information query is answered from the crop and its caption
+    instead of the full document text. Figures that start after `budget` is
+    exhausted are skipped and recorded as cuts.
+    """
     try:
         answers = {i: {} for i in range(total_figures)}
+        use_vision = bool(figures) and supports_vision(model_name)
 
+        @profiled("figure_task")
         def process_single_figure(i):
-            info = query_document(
-                document,
-                prompt_template=FIGURE_INFO_TEMPLATE,
-                model_name=model_name,
-                provider=provider,
-                api_key=api_key,
-                figure_number=i + 1
-            )
+            if budget is not None and budget.is_exhausted():
+                budget.cut(f"Figure {i + 1}", "analysis skipped")
+                skipped = skipped_response("analysis budget exhausted")
+                return i, {"Information": skipped, "Connection": skipped}
+            if use_vision and (i + 1) in figures:
+                info = query_figure_image(
+                    figures[i + 1],
+                    model_name=model_name,
+                    provider=provider,
+                    api_key=api_key,
+                    events=events,
+                    max_tokens=info_max_tokens,
+                    transcript=transcript,
+                    replay_dir=replay_dir
+                )
+            else:
+                info = query_document(
+                    document,
+                    prompt_template=FIGURE_INFO_TEMPLATE,
+                    model_name=model_name,
+                    provider=provider,
+                    api_key=api_key,
+                    events=events,
+                    max_tokens=info_max_tokens,
+                    transcript=transcript,
+                    replay_dir=replay_dir,
+                    figure_number=i + 1
+                )
             conn = query_document(
                 document,
                 prompt_template=FIGURE_CONNECTION_TEMPLATE,
                 model_name=model_name,
                 provider=provider,
                 api_key=api_key,
+                events=events,
+                max_tokens=connection_max_tokens,
+                transcript=transcript,
+                replay_dir=replay_dir,
                 figure_number=i + 1
             )
             return i, {"Information": info, "Connection": conn}
@@ -64,36 +231,48 @@ def process_figure_answers(document, total_figures: int, model_name: str = DEFAU
 
         # Use ThreadPoolExecutor for parallel processing
         with ThreadPoolExecutor() as executor:
-            future_to_figure = {executor.submit(process_single_figure, i): i
-                                for i in range(total_figures)}
+            task = propagate(process_single_figure)
+            future_to_figure = {executor.submit(task, i): i for i in range(total_figures)}
 
             for future in concurrent.futures.as_completed(future_to_figure):
                 i, result = future.result()
                 answers[i] = result
                 completed_figures += 1
-                print(
-                    f"Progress: {completed_figures}/{total_figures} figures completed (Figure {i+1} done)")
+                emit(events, FIGURE_COMPLETED, figure_number=i + 1,
+                     completed=completed_figures, total=total_figures)
 
         return answers
 
     except Exception as e:
-        print(f"Error processing figures: {str(e)}")
+        emit(events, LOG, level="error", message=f"Error processing figures: {str(e)}")
         raise
 
 
 def expand_figure_answers(document, answers: dict, model_name: str = DEFAULT_MODEL, 
-                         provider: str = DEFAULT_PROVIDER, api_key: str = None) -> dict:
-    """Expand answers with additional context in parallel"""
+                         provider: str = DEFAULT_PROVIDER, api_key: str = None, events=None,
+                         max_tokens: int = None, budget=None, transcript=None, replay_dir=None) -> dict:
+    """
+    Expand answers with additional context in parallel.
+    Figures reached after `budget` is exhausted keep their unexpanded answers.
+    """
     try:
         expanded_answers = {i: {} for i in range(len(answers))}
 
+        @profiled("expansion_task")
         def expand_single_figure(i):
+            if budget is not None and budget.is_exhausted():
+                budget.cut(f"Figure {i + 1}", "expansion skipped")
+                return i, answers[i]
             info = query_document(
                 document,
                 prompt_template=EXPAND_ANSWER_TEMPLATE,
                 model_name=model_name,
                 provider=provider,
                 api_key=api_key,
+                events=events,
+                max_tokens=max_tokens,
+                transcript=transcript,
+                replay_dir=replay_dir,
                 answer=answers[i]["Information"].content,
                 text=document
             )
@@ -103,6 +282,10 @@ def expand_figure_answers(document, answers: dict, model_name: str = DEFAULT_MOD
                 model_name=model_name,
                 provider=provider,
                 api_key=api_key,
+                events=events,
+                max_tokens=max_tokens,
+                transcript=transcript,
+                replay_dir=replay_dir,
                 answer=answers[i]["Connection"].content,
                 text=document
             )
@@ -113,26 +296,27 @@ def expand_figure_answers(document, answers: dict, model_name: str = DEFAULT_MOD
 
         # Use ThreadPoolExecutor for parallel processing
         with ThreadPoolExecutor() as executor:
-            future_to_figure = {executor.submit(expand_single_figure, i): i
-                                for i in range(len(answers))}
+            task = propagate(expand_single_figure)
+            future_to_figure = {executor.submit(task, i): i for i in range(len(answers))}
 
             for future in concurrent.futures.as_completed(future_to_figure):
                 i, result = future.result()
                 expanded_answers[i] = result
                 completed_expansions += 1
-                print(
-                    f"Progress: {completed_expansions}/{total_expansions} expansions completed (Figure {i+1} done)")
+                emit(events, EXPANSION_COMPLETED, figure_number=i + 1,
+                     completed=completed_expansions, total=total_expansions)
 
         return expanded_answers
 
     except Exception as e:
-        print(f"Error expanding answers: {str(e)}")
+        emit(events, LOG, level="error", message=f"Error expanding answers: {str(e)}")
         raise
 
 
 def query_and_expand(document, prompt_template, model_name=DEFAULT_MODEL, provider=DEFAULT_PROVIDER,
                     api_key=None, expansion_model_name=None, expansion_provider=None,
-                    pydantic_model=None, **prompt_variables):
+                    pydantic_model=None, events=None, max_tokens=None, expansion_max_tokens=None,
+                    transcript=None, replay_dir=None, **prompt_variables):
     """
     Query the document and expand the answer in a single function.
     
@@ -145,6 +329,11 @@ def query_and_expand(document, prompt_template, model_name=DEFAULT_MODEL, provid
         expansion_model_name: Optional different model to use for expansion
         expansion_provider: Optional different provider to use for expansion
         pydantic_model: Optional Pydantic model for structured output
+        events: Optional EventBus receiving an llm_call event per request
+        max_tokens: Optional cap on tokens generated for the initial answer
+        expansion_max_tokens: Optional cap on tokens generated for the expansion
+        transcript: Optional TranscriptRecorder recording both requests
+        replay_dir: Transcript directory for the replay provider
         **prompt_variables: Additional variables for the prompt template
     
     Returns:
@@ -162,6 +351,10 @@ def query_and_expand(document, prompt_template, model_name=DEFAULT_MODEL, provid
         provider=provider,
         api_key=api_key,
         pydantic_model=pydantic_model,
+        events=events,
+        max_tokens=max_tokens,
+        transcript=transcript,
+        replay_dir=replay_dir,
         **prompt_variables
     )
 
@@ -172,6 +365,10 @@ def query_and_expand(document, prompt_template, model_name=DEFAULT_MODEL, provid
         model_name=expansion_model_name,
         provider=expansion_provider,
         api_key=api_key,
+        events=events,
+        max_tokens=expansion_max_tokens,
+        transcript=transcript,
+        replay_dir=replay_dir,
         answer=str(initial_response),
         text=document
     )
@@ -179,13 +376,126 @@ def query_and_expand(document, prompt_template, model_name=DEFAULT_MODEL, provid
     return expanded_response
 
 
-def write_analysis_to_file(answers: dict, output_path: str = "analysis.txt") -> None:
+def _timed_query(document, prompt_template, target, expand, pydantic_model, events, transcript, replay_dir,
+                 max_tokens, prompt_variables):
+    """Run one query against a (provider, model_name, api_key) target and time it."""
+    provider, model_name, api_key = target
+    if expand:
+        query_fn, limits = query_and_expand, {"max_tokens": max_tokens, "expansion_max_tokens": max_tokens}
+    else:
+        query_fn, limits = query_document, {"max_tokens": max_tokens}
+    start = time.perf_counter()
+    result = {"provider": provider, "model_name": model_name, "response": None, "error": None}
+    try:
+        result["response"] = query_fn(
+            document,
+            prompt_template=prompt_template,
+            model_name=model_name,
+            provider=provider,
+            api_key=api_key,
+            pydantic_model=pydantic_model,
+            events=events,
+            transcript=transcript,
+            replay_dir=replay_dir,
+            **limits,
+            **prompt_variables
+        )
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def fan_out_query(document, prompt_template, targets, expand=False, pydantic_model=None,
+                  events=None, transcript=None, replay_dir=None, max_tokens=None, **prompt_variables) -> list:
+    """
+    Send the same query to several providers concurrently.
+
+    Args:
+        document: The document to query
+        prompt_template: Template for the query
+        targets: List of (provider, model_name, api_key) tuples
+        expand: Whether to expand each answer as query_and_expand does
+        pydantic_model: Optional Pydantic model for structured output
+        events: Optional EventBus receiving llm_call events
+        transcript: Optional TranscriptRecorder recording every request
+        replay_dir: Transcript directory for replay targets
+        max_tokens: Optional cap on tokens generated for each answer (and its expansion)
+        **prompt_variables: Additional variables for the prompt template
+
+    Returns:
+        One dict per target, in the order given, with provider, model_name, response,
+        error (None on success) and elapsed seconds; an empty list when there are no targets
+    """
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        timed_query = propagate(_timed_query)
+        futures = [executor.submit(timed_query, document, prompt_template, target, expand,
+                                   pydantic_model, events, transcript, replay_dir, max_tokens,
+                                   prompt_variables)
+                   for target in targets]
+        return [future.result() for future in futures]
+
+
+def hedged_query(document, prompt_template, primary, backup, hedge_after=HEDGE_AFTER_SECONDS,
+                 expand=False, pydantic_model=None, events=None, transcript=None, replay_dir=None,
+                 max_tokens=None, **prompt_variables) -> dict:
+    """
+    Query the primary target and, if it has not answered within `hedge_after` seconds (or it
+    failed), send the same request to the backup target and take whichever answers first.
+
+    Args:
+        primary: (provider, model_name, api_key) tuple queried first
+        backup: (provider, model_name, api_key) tuple used as the hedge
+
+    Returns:
+        A result dict as returned by fan_out_query for the winning target, with `hedged` set
+        when the backup request was sent
+
+    Raises:
+        RuntimeError: If both targets fail
+    """
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        args = (document, prompt_template)
+        rest = (expand, pydantic_model, events, transcript, replay_dir, max_tokens, prompt_variables)
+        timed_query = propagate(_timed_query)
+        pending = {executor.submit(timed_query, *args, primary, *rest)}
+        done, pending = concurrent.futures.wait(pending, timeout=hedge_after)
+        if done:
+            result = done.pop().result()
+            if result["error"] is None:
+                result["hedged"] = False
+                return result
+            errors = [result["error"]]
+        else:
+            errors = []
+
+        emit(events, HEDGE, provider=backup[0], model_name=backup[1],
+             primary_provider=primary[0], after=hedge_after)
+        pending.add(executor.submit(timed_query, *args, backup, *rest))
+        for future in concurrent.futures.as_completed(pending):
+            result = future.result()
+            if result["error"] is None:
+                result["hedged"] = True
+                return result
+            errors.append(result["error"])
+        raise RuntimeError(f"All hedged requests failed: {'; '.join(errors)}")
+    finally:
+        # Do not wait for the slower request; its answer is discarded
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@profiled("write_figures_analysis")
+def write_analysis_to_file(answers: dict, output_path: str = "analysis.txt", events=None) -> None:
     """
     Write figure analysis results to a text file.
     
     Args:
         answers: Dictionary containing the analysis
         output_path: Path where the output file should be saved
+        events: Optional EventBus receiving the outcome as log events
     """
     try:
         with open(output_path, 'a', encoding='utf-8') as f:
@@ -197,8 +507,8 @@ def write_analysis_to_file(answers: dict, output_path: str = "analysis.txt") ->
                 f.write(f"Connection:\n{answers[i]['Connection'].content}\n\n")
                 f.write("="*50 + "\n\n")  # Separator between figures
 
-        print(f"Analysis written successfully to {output_path}")
+        emit(events, LOG, level="info", message=f"Analysis written successfully to {output_path}")
 
     except Exception as e:
-        print(f"Error writing to file: {str(e)}")
+        emit(events, LOG, level="error", message=f"Error writing to file: {str(e)}")
         raise
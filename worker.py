@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from events import EventBus, ProgressListener
+from config import (OUTPUT_DIR, DEFAULT_MODEL, DEFAULT_PROVIDER, API_KEY_ENV_VARS,
+                    JOBS_DB, WORKER_CONCURRENCY, WORKER_POLL_INTERVAL, WORKER_HEARTBEAT_INTERVAL,
+                    WORKER_STALE_AFTER)
+
+JOB_COLUMNS = ["id", "pdf_path", "provider", "model_name", "output_dir", "status",
+               "stage", "progress", "error", "result_dir", "created_at", "updated_at",
+               "worker_id", "heartbeat_at"]
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOBS_DB):
+        """Initialize the SQLite-backed job queue, creating the database if needed."""
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pdf_path TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    output_dir TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    error TEXT,
+                    result_dir TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    worker_id TEXT,
+                    heartbeat_at REAL
+                )""")
+            # Databases created before jobs recorded their worker
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("worker_id TEXT", "heartbeat_at REAL"):
+                if column.split()[0] not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+
+    def _connect(self):
+        # A short-lived connection per operation keeps the queue safe to share between threads
+        # and between the worker, the CLI and the Streamlit app
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, pdf_path: str, provider: str = DEFAULT_PROVIDER, model_name: str = DEFAULT_MODEL,
+               output_dir: str = OUTPUT_DIR) -> int:
+        """Add a PDF to the queue and return the new job id."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (pdf_path, provider, model_name, output_dir, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(pdf_path), provider, model_name, os.path.abspath(output_dir), QUEUED, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_id: str = None):
+        """
+        Atomically mark the oldest queued job as running by `worker_id` and return it,
+        or None if the queue is empty.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, worker_id, now, now, row["id"])
+            )
+            conn.execute("COMMIT")
+            job = dict(row)
+            job.update(status=RUNNING, worker_id=worker_id, heartbeat_at=now, updated_at=now)
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def update(self, job_id: int, owner: str = None, **fields) -> bool:
+        """
+        Update status, stage, progress, error or result_dir of a job. With `owner`, the job is only
+        updated while that worker still holds it. Returns whether the job was updated.
+        """
+        unknown = set(fields) - set(JOB_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        condition, params = "id = ?", [job_id]
+        if owner is not None:
+            condition, params = "id = ? AND worker_id = ?", [job_id, owner]
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(f"UPDATE jobs SET {assignments} WHERE {condition}", (*fields.values(), *params))
+            return cursor.rowcount > 0
+
+    def get(self, job_id: int):
+        """Return a job as a dict, or None if it does not exist."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, limit: int = 50) -> list:
+        """Return the most recent jobs, newest first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def heartbeat(self, worker_id: str) -> None:
+        """Mark the jobs `worker_id` is running as alive."""
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = ?",
+                         (time.time(), worker_id, RUNNING))
+
+    def requeue_stale(self, stale_after: float = WORKER_STALE_AFTER) -> int:
+        """
+        Put running jobs whose worker has not sent a heartbeat for `stale_after` seconds back
+        on the queue. Jobs of live workers, including other workers on the same database, are kept.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, progress = 0, worker_id = NULL, updated_at = ? "
+                "WHERE status = ? AND COALESCE(heartbeat_at, updated_at) < ?",
+                (QUEUED, now, RUNNING, now - stale_after)
+            )
+            return cursor.rowcount
+
+    def wait(self, job_id: int, poll_interval: float = WORKER_POLL_INTERVAL, on_update=None):
+        """Block until the job is done or failed, calling on_update(job) whenever it changes."""
+        last_seen = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                raise ValueError(f"Unknown job: {job_id}")
+            if on_update and job["updated_at"] != last_seen:
+                on_update(job)
+                last_seen = job["updated_at"]
+            if job["status"] in (DONE, FAILED):
+                return job
+            time.sleep(poll_interval)
+
+
+class JobProgressListener(ProgressListener):
+    """
+    Record a job's current stage and overall progress from analyzer events. With `owner`, the
+    analysis is stopped (by raising RuntimeError) once the job has been handed to another worker.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: int, owner: str = None):
+        super().__init__(self.update)
+        self.queue = queue
+        self.job_id = job_id
+        self.owner = owner
+
+    def update(self, label: str, fraction: float) -> None:
+        if not self.queue.update(self.job_id, owner=self.owner, stage=label, progress=fraction):
+            raise RuntimeError(f"Job {self.job_id} was requeued and is no longer held by this worker")
+
+
+class Worker:
+    def __init__(self, queue: JobQueue, concurrency: int = WORKER_CONCURRENCY,
+                 poll_interval: float = WORKER_POLL_INTERVAL, api_keys: dict = None,
+                 heartbeat_interval: float = WORKER_HEARTBEAT_INTERVAL, stale_after: float = WORKER_STALE_AFTER):
+        """
+        Initialize a worker that processes up to `concurrency` jobs from the queue at a time.
+
+        While it runs, the worker sends a heartbeat for its jobs every `heartbeat_interval`
+        seconds and requeues jobs whose worker has been silent for `stale_after` seconds.
+        """
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.api_keys = api_keys or {provider: os.getenv(env_var) for provider, env_var in API_KEY_ENV_VARS.items()}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+
+    def stop(self) -> None:
+        """Ask the worker to stop claiming new jobs; running jobs are allowed to finish."""
+        self._stop.set()
+
+    def _requeue_stale(self) -> None:
+        requeued = self.queue.requeue_stale(self.stale_after)
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s)")
+
+    def _heartbeat(self) -> None:
+        # Runs until the last job has finished, not just until stop(), so draining jobs stay alive
+        while not self._finished.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(self.worker_id)
+                self._requeue_stale()
+            except Exception as e:
+                # e.g. the database stayed locked; try again on the next beat rather than go silent
+                print(f"Heartbeat failed: {str(e)}")
+
+    def run(self) -> None:
+        """Process jobs until stop() is called."""
+        self._finished.clear()
+        self._requeue_stale()
+        print(f"Worker {self.worker_id} started with {self.concurrency} slot(s), queue at {self.queue.db_path}")
+
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                while not self._stop.is_set():
+                    if not self._slots.acquire(timeout=self.poll_interval):
+                        continue
+                    job = self.queue.claim(self.worker_id)
+                    if job is None:
+                        self._slots.release()
+                        self._stop.wait(self.poll_interval)
+                        continue
+                    executor.submit(self._run_job, job)
+        finally:
+            self._finished.set()
+            heartbeat.join()
+
+    def _run_job(self, job: dict) -> None:
+        try:
+            self.process(job)
+        finally:
+            self._slots.release()
+
+    def process(self, job: dict) -> None:
+        """Run the analysis pipeline for one job and record its outcome."""
+        from paper_analyzer import PaperAnalyzer
+
+        job_id = job["id"]
+        print(f"Job {job_id}: analyzing {job['pdf_path']}")
+        try:
+            events = EventBus()
+            events.subscribe(JobProgressListener(self.queue, job_id, owner=self.worker_id))
+            analyzer = PaperAnalyzer(
+                job["pdf_path"],
+                api_key=self.api_keys.get(job["provider"]),
+                model_name=job["model_name"],
+                provider=job["provider"],
+                output_dir=job["output_dir"],
+                events=events
+            )
+            analyzer.analyze()
+            if self.queue.update(job_id, owner=self.worker_id, status=DONE, progress=1.0,
+                                 result_dir=analyzer.output_dir):
+                print(f"Job {job_id}: done")
+            else:
+                print(f"Job {job_id}: finished, but another worker holds it now; not recorded")
+        except Exception as e:
+            if self.queue.update(job_id, owner=self.worker_id, status=FAILED, error=str(e)):
+                print(f"Job {job_id}: failed: {str(e)}")
+            else:
+                print(f"Job {job_id}: stopped, another worker holds it now")
+
+
+def format_job(job: dict) -> str:
+    """Format a job as a single status line."""
+    line = f"Job {job['id']} [{job['status']}] {int(job['progress'] * 100)}%"
+    if job["stage"]:
+        line += f" {job['stage']}"
+    if job["error"]:
+        line += f" - {job['error']}"
+    if job["result_dir"]:
+        line += f" -> {job['result_dir']}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background worker and job queue for the paper analyzer")
+    parser.add_argument("--db", help="Path to the job queue database", default=JOBS_DB)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Start a worker that processes queued jobs")
+    run_parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Papers analyzed at the same time")
+
+    submit_parser = subparsers.add_parser("submit", help="Queue a PDF for analysis")
+    submit_parser.add_argument("pdf_path", help="Path to the PDF file to analyze")
+    submit_parser.add_argument("--output-dir", help="Custom output directory", default=OUTPUT_DIR)
+    submit_parser.add_argument("--model-name", help="Model name", default=DEFAULT_MODEL)
+    submit_parser.add_argument("--provider", help="Model provider", default=DEFAULT_PROVIDER)
+    submit_parser.add_argument("--wait", action="store_true", help="Wait for the job to finish")
+
+    status_parser = subparsers.add_parser("status", help="Show job status")
+    status_parser.add_argument("job_id", type=int, nargs="?", help="Job id (default: list recent jobs)")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.db)
+
+    if args.command == "run":
+        import dotenv
+        dotenv.load_dotenv()
+        worker = Worker(queue, concurrency=args.concurrency)
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            print("Stopping worker...")
+            worker.stop()
+    elif args.command == "submit":
+        job_id = queue.submit(args.pdf_path, provider=args.provider, model_name=args.model_name,
+                              output_dir=args.output_dir)
+        print(f"Submitted job {job_id}")
+        if args.wait:
+            job = queue.wait(job_id, on_update=lambda job: print(format_job(job)))
+            if job["status"] == FAILED:
+                exit(1)
+    elif args.command == "status":
+        jobs = [queue.get(args.job_id)] if args.job_id else queue.list_jobs()
+        for job in jobs:
+            if job is None:
+                print(f"Unknown job: {args.job_id}")
+                exit(1)
+            print(format_job(job))
+
+
+if __name__ == "__main__":
+    main()